@@ -1,79 +1,154 @@
 import os
-import subprocess
 from datetime import datetime
 import zipfile
-import traceback
-import base64
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
 from dotenv import load_dotenv
 import io
+import threading
+import time
+import logging
+import hmac
+import gzip
+import functools
 
-import pandas as pd
 from werkzeug.utils import secure_filename
-from jinja2 import Environment, FileSystemLoader
-from flask import Flask, request, jsonify, send_file, render_template
-from s3_utils import upload_to_s3, list_s3_pdfs, download_s3_file_to_memory
+from flask import Flask, request, jsonify, send_file, render_template, redirect
+from s3_utils import (get_s3_client, upload_to_s3, download_from_s3, list_s3_pdfs, download_s3_file_to_memory,
+                      read_s3_object, presigned_url, refresh_month_archive, PRESIGNED_URL_EXPIRY)
+from renderer import COMPANY, PDF_POSTPROCESS, get_template, get_wkhtmltopdf_cmd, write_html, convert_to_pdf, optimize_pdf
+from pipeline import Stage, Pipeline, active_stats
+from render_queue import get_queue
+from upload_cache import save_upload, has_cached_table, load_cached_table, store_cached_table
+from sheet_validation import validate_table
+from run_checkpoints import (STEPS as CHECKPOINT_STEPS, make_run_id, start_run, finish_run, get_run, load_checkpoints,
+                             mark, claim_email, release_email, run_progress, save_preview, query_preview, select_preview, set_email_status,
+                             PREVIEW_FIELDS)
+from payroll_history import make_record, append_run, unit_totals, ytd_by_employee, statutory_summary
+from log_config import setup_logging, run_context
+from profiling import profile_job, list_profiles, profile_path
+from scheduler import scheduler, clamp_priority
+from render_supervisor import CircuitOpenError, supervisor
+from slip_index import record_slips, find_slip, cache as slip_cache
+from unit_bundles import build_bundles
+from scratch import (OUTPUT_DIR, UPLOAD_DIR, run_scratch, pdf_dir, html_dir, discard, is_active as run_is_active,
+                     usage as scratch_usage)
 
 load_dotenv()
+setup_logging("app")
+logger = logging.getLogger(__name__)
 app = Flask(__name__)
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
-OUTPUT_DIR = os.path.join(BASE_DIR, "payslips")
-TEMPLATE_DIR = os.path.join(BASE_DIR, "templates")
-LOGO_PATH = os.path.join(BASE_DIR, "logo.png")
-
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-# Detect wkhtmltopdf path (Docker vs Windows)
-if os.path.exists('/usr/local/bin/wkhtmltopdf'):
-    WKHTMLTOPDF_CMD = '/usr/local/bin/wkhtmltopdf'
-elif os.path.exists('/usr/bin/wkhtmltopdf'):
-    WKHTMLTOPDF_CMD = '/usr/bin/wkhtmltopdf'
-else:
-    WKHTMLTOPDF_CMD = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
-print(f"Using wkhtmltopdf at: {WKHTMLTOPDF_CMD}")
-
-COMPANY = {
-    "name": "RS MAN-TECH",
-    "address": "#14, 3rd Cross, Parappana Agrahara",
-    "city": "Bengaluru-100"
-}
+RENDER_MODE = os.getenv("RENDER_MODE", "local")
+RENDER_CHUNK_SIZE = int(os.getenv("RENDER_CHUNK_SIZE", "25"))
+
+# Per-stage thread counts for the generation pipeline; queues between stages
+# hold at most PIPELINE_QUEUE_SIZE items
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "16"))
+NORMALIZE_WORKERS = int(os.getenv("NORMALIZE_WORKERS", "1"))
+HTML_WORKERS = int(os.getenv("HTML_WORKERS", "1"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+STORE_WORKERS = int(os.getenv("STORE_WORKERS", "4"))
+NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", "2"))
+OPTIMIZE_WORKERS = int(os.getenv("OPTIMIZE_WORKERS", "1"))
 
 EMAIL_CONFIG = {
     "smtp_server": os.getenv("SMTP_SERVER", "smtp.gmail.com"),
     "smtp_port": int(os.getenv("SMTP_PORT", "587")),
+    # Local SMTP sinks (load tests, dev) don't speak TLS
+    "starttls": os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes", "on"),
     "sender_email": os.getenv("SENDER_EMAIL", ""),
     "password": os.getenv("EMAIL_PASSWORD", ""),
 }
 
-current_session_pdfs = []
+# "stream" zips PDFs through this process; "presigned" redirects /download to
+# a cached archive in S3. ?delivery= overrides per request
+DOWNLOAD_DELIVERY = os.getenv("DOWNLOAD_DELIVERY", "stream")
+# Seconds a client should wait before asking again for a month archive still being built
+ARCHIVE_RETRY_AFTER = int(os.getenv("ARCHIVE_RETRY_AFTER", "5"))
+# "attachment" mails the PDF itself; "link" mails a presigned S3 link that
+# expires after EMAIL_LINK_EXPIRY seconds
+EMAIL_DELIVERY = os.getenv("EMAIL_DELIVERY", "attachment")
+EMAIL_LINK_EXPIRY = int(os.getenv("EMAIL_LINK_EXPIRY", str(72 * 3600)))
+
+# Rows returned inline by /upload; the rest is paged from /runs/<run_id>/preview
+PREVIEW_PAGE_SIZE = int(os.getenv("PREVIEW_PAGE_SIZE", "50"))
+# JSON responses at least this big are gzipped for clients that accept it
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
 
-def get_logo_base64():
+# Admin-only features (profiling) need this token in X-Admin-Token; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Profile every upload/send/download job, not just ones requested with profile=1
+PROFILE_JOBS = os.getenv("PROFILE_JOBS", "").lower() in ("1", "true", "yes", "on")
+
+# Heavy dependencies (pandas, pyarrow, boto3, wkhtmltopdf, templates) load on
+# first use; /ready warms them in a background thread after boot
+_warmup = {"started": False, "done": False, "components": {}, "error": None}
+_warmup_lock = threading.Lock()
+
+def warm_up():
+    """Import and initialize heavy dependencies, recording how long each took"""
+    steps = [
+        ("pandas", lambda: __import__("pandas")),
+        ("pyarrow", lambda: __import__("pyarrow.dataset")),
+        ("s3_client", get_s3_client),
+        ("renderer", lambda: (get_wkhtmltopdf_cmd(), get_template())),
+    ]
     try:
-        if os.path.exists(LOGO_PATH):
-            with open(LOGO_PATH, "rb") as img_file:
-                return base64.b64encode(img_file.read()).decode('utf-8')
+        for name, step in steps:
+            start = time.perf_counter()
+            step()
+            _warmup["components"][name] = round((time.perf_counter() - start) * 1000, 1)
     except Exception as e:
-        print(f"Could not load logo: {e}")
-        return None
+        _warmup["error"] = str(e)
+        logger.warning("Warm-up failed: %s", e)
+    finally:
+        _warmup["done"] = True
 
-def send_email(to_email, emp_name, pdf_path, month):
+def start_warm_up():
+    with _warmup_lock:
+        if not _warmup["started"]:
+            _warmup["started"] = True
+            threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+def send_email(to_email, emp_name, pdf_path, month, s3_key=None):
     try:
-        print(f"  Preparing email for {to_email}...")
+        logger.debug("Preparing email for %s", to_email)
         if not EMAIL_CONFIG["sender_email"] or not EMAIL_CONFIG["password"]:
-            print("  ERROR: Email credentials not configured")
+            logger.error("Email credentials not configured")
             return False
 
+        filename = f'Payslip_{month}_{emp_name.replace(" ", "_")}.pdf'
+        link = None
+        if EMAIL_DELIVERY == "link":
+            if s3_key:
+                link = presigned_url(s3_key, expires=EMAIL_LINK_EXPIRY, download_name=filename)
+            else:
+                logger.warning("No S3 copy for %s; attaching the PDF instead of a link", to_email)
+
         msg = MIMEMultipart()
         msg['From'] = EMAIL_CONFIG["sender_email"]
         msg['To'] = to_email
         msg['Subject'] = f"Payslip for {month} - {COMPANY['name']}"
-        body = f"""Dear {emp_name},
+        if link:
+            hours = max(1, min(EMAIL_LINK_EXPIRY, 7 * 24 * 3600) // 3600)
+            body = f"""Dear {emp_name},
+
+Your payslip for the month of {month} is ready. Download it here:
+{link}
+
+This link expires in {hours} hour(s).
+
+Best regards,
+{COMPANY['name']}
+HR Department"""
+        else:
+            body = f"""Dear {emp_name},
 
 Please find attached your payslip for the month of {month}.
 
@@ -82,23 +157,26 @@ Best regards,
 HR Department"""
         msg.attach(MIMEText(body, 'plain'))
 
-        with open(pdf_path, 'rb') as file:
-            pdf_attachment = MIMEApplication(file.read(), _subtype='pdf')
-            pdf_attachment.add_header('Content-Disposition', 'attachment', filename=f'Payslip_{month}_{emp_name.replace(" ", "_")}.pdf')
-            msg.attach(pdf_attachment)
+        if not link:
+            with open(pdf_path, 'rb') as file:
+                pdf_attachment = MIMEApplication(file.read(), _subtype='pdf')
+                pdf_attachment.add_header('Content-Disposition', 'attachment', filename=filename)
+                msg.attach(pdf_attachment)
 
         server = smtplib.SMTP(EMAIL_CONFIG["smtp_server"], EMAIL_CONFIG["smtp_port"])
-        server.starttls()
+        if EMAIL_CONFIG["starttls"]:
+            server.starttls()
         server.login(EMAIL_CONFIG["sender_email"], EMAIL_CONFIG["password"])
         server.send_message(msg)
         server.quit()
-        print(f"  ✓ Email sent to {to_email}")
+        logger.info("Email sent to %s", to_email, extra={"delivery": "link" if link else "attachment"})
         return True
     except Exception as e:
-        print(f"  ✗ Email failed for {to_email}: {str(e)}")
+        logger.warning("Email failed for %s: %s", to_email, e)
         return False
 
 def get_numeric_value(val, default=0):
+    import pandas as pd
     try:
         return float(val) if pd.notna(val) else default
     except:
@@ -157,387 +235,909 @@ def number_to_words(num):
             result += " " + convert_below_thousand(remainder)
     return result.strip() + " rupees only"
 
-@app.route("/")
-def dashboard():
-    return render_template("dashboard.html")
+def is_truthy(value):
+    return str(value or "").lower() in ("1", "true", "yes", "on")
 
-@app.route("/upload", methods=["POST"])
-def upload_file():
-    global current_session_pdfs
-    current_session_pdfs = []
-    
-    try:
-        print("\n" + "="*80)
-        print("STARTING PAYSLIP GENERATION")
-        print("="*80)
+def pdf_size_summary(results):
+    """Total and per-slip PDF bytes before and after post-processing"""
+    sizes = [(item["pdf_bytes_raw"], item["pdf_bytes"]) for item in results if item.get("pdf_bytes")]
+    if not sizes:
+        return None
+    raw = sum(b for b, _ in sizes)
+    final = sum(a for _, a in sizes)
+    summary = {"slips": len(sizes), "raw_bytes": raw, "final_bytes": final,
+               "avg_raw_bytes": raw // len(sizes), "avg_final_bytes": final // len(sizes),
+               "saved_pct": round(100 * (raw - final) / raw, 1) if raw else 0.0}
+    logger.info("PDF sizes: %d slips, avg %d -> %d bytes (%s%% saved)", summary["slips"],
+                summary["avg_raw_bytes"], summary["avg_final_bytes"], summary["saved_pct"], extra={"pdf_sizes": summary})
+    return summary
 
-        if "csv_file" not in request.files:
-            return jsonify({"error": "No file uploaded"}), 400
+def preview_entry(item, status, error=None):
+    """Preview row for one pipeline item; failed items may not have a payslip yet"""
+    slip = item.get("slip") or {}
+    emp = slip.get("emp") or {}
+    email_status = item.get("email_status")
+    return {"Row": int(item["index"]) + 1, "EMP_ID": item.get("emp_id"), "Name": emp.get("name"),
+            "Designation": emp.get("designation"), "Unit_Name": emp.get("unit_name"), "Email": emp.get("email"),
+            "Net_Pay": slip.get("net_pay"), "Status": status, "Email_Status": email_status.lower() if email_status else None,
+            "Error": error, "PDF_Path": item.get("pdf_path"), "S3_Key": item.get("s3_key"),
+            "PDF_Bytes": item.get("pdf_bytes")}
 
-        file = request.files["csv_file"]
-        month = request.form.get("month", "NA")
-        year = request.form.get("year", str(datetime.now().year))
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(UPLOAD_DIR, filename)
-        file.save(file_path)
+def is_admin():
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+def submitter_of():
+    """Who a job is for, for fair sharing: X-Submitter or a submitter field, else the client address"""
+    body = request.get_json(silent=True) if request.is_json else None
+    submitter = request.headers.get("X-Submitter") or request.form.get("submitter") \
+        or (body or {}).get("submitter")
+    if not submitter:
+        forwarded = request.headers.get("X-Forwarded-For", "")
+        submitter = forwarded.split(",")[0].strip() or request.remote_addr
+    return str(submitter)[:100]
+
+def requested_priority():
+    """The job's priority field; anyone may lower theirs, only admins may raise it"""
+    body = request.get_json(silent=True) if request.is_json else None
+    value = request.form.get("priority") or request.args.get("priority") or (body or {}).get("priority")
+    return clamp_priority(value, allow_raise=is_admin())
 
-        ext = os.path.splitext(file_path)[1].lower()
-        if ext == ".csv":
+def profiled(job):
+    """Run a job route under cProfile when PROFILE_JOBS is set or an admin sends profile=1.
+
+    The profile is saved under the run id (from the JSON response or the
+    URL). For admin callers the hottest functions are added to JSON
+    responses as "profile"; file responses get an X-Profile header naming
+    the saved file instead.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            requested = is_truthy(request.args.get("profile") or request.form.get("profile"))
+            if not (requested or PROFILE_JOBS):
+                return view(*args, **kwargs)
+            if requested and not is_admin():
+                return jsonify({"error": "Profiling requires a valid X-Admin-Token"}), 403
+
+            with profile_job(job) as session:
+                response = app.make_response(view(*args, **kwargs))
+            body = response.get_json(silent=True) if response.is_json else None
+            run_id = ((body or {}).get("run_id") if isinstance(body, dict) else None) or kwargs.get("run_id") \
+                or request.args.get("run_id") or f"{job}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            summary = session.save(run_id)
+            if not is_admin():
+                # PROFILE_JOBS profiles everyone's jobs; only admins see the results
+                return response
+            if isinstance(body, dict):
+                status = response.status_code
+                response = jsonify(dict(body, profile=summary))
+                response.status_code = status
+            else:
+                response.headers["X-Profile"] = f"/runs/{run_id}/profiles/{summary['profile']}"
+            return response
+        return wrapper
+    return decorator
+
+def read_employee_file(file_path):
+    """Parse an uploaded CSV/Excel file into a normalized employee table"""
+    import pandas as pd
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".csv":
+        try:
+            df = pd.read_csv(file_path, encoding="utf-8", engine="python")
+        except UnicodeDecodeError:
+            df = pd.read_csv(file_path, encoding="latin1", engine="python")
+    elif ext in [".xlsx", ".xls"]:
+        # Find the correct header row by looking for EMP_ID or NAME column
+        header_row = None
+        for row_num in range(10):  # Check first 10 rows
             try:
-                df = pd.read_csv(file_path, encoding="utf-8", engine="python")
-            except UnicodeDecodeError:
-                df = pd.read_csv(file_path, encoding="latin1", engine="python")
-        elif ext in [".xlsx", ".xls"]:
-            # Find the correct header row by looking for EMP_ID or NAME column
-            header_row = None
-            for row_num in range(10):  # Check first 10 rows
-                try:
-                    test_df = pd.read_excel(file_path, header=row_num, nrows=1)
-                    cols_lower = [str(c).lower() for c in test_df.columns]
-                    if any('emp' in c or 'name' in c or 'id' in c for c in cols_lower if not c.startswith('unnamed')):
-                        header_row = row_num
-                        print(f"Found header row at: {row_num}")
-                        break
-                except:
-                    continue
+                test_df = pd.read_excel(file_path, header=row_num, nrows=1)
+                cols_lower = [str(c).lower() for c in test_df.columns]
+                if any('emp' in c or 'name' in c or 'id' in c for c in cols_lower if not c.startswith('unnamed')):
+                    header_row = row_num
+                    logger.debug("Found header row at: %d", row_num)
+                    break
+            except:
+                continue
+        
+        if header_row is not None:
+            df = pd.read_excel(file_path, header=header_row)
             
-            if header_row is not None:
-                df = pd.read_excel(file_path, header=header_row)
-                
-                # Handle multi-row headers by merging with next row if needed
-                # Check if next row has additional column names
-                try:
-                    next_row_df = pd.read_excel(file_path, header=header_row+1, nrows=1)
-                    next_cols = [str(c).lower() for c in next_row_df.columns]
-                    # If next row has salary columns, merge the headers
-                    if any('fixed' in c or 'earned' in c or 'deduction' in c for c in next_cols if not c.startswith('unnamed')):
-                        print(f"Detected multi-row headers, merging row {header_row} and {header_row+1}")
-                        # Read both rows as headers
-                        df = pd.read_excel(file_path, header=[header_row, header_row+1])
-                        # Flatten multi-level columns and remove duplicate prefixes
-                        new_cols = []
-                        for col in df.columns:
-                            parts = [str(c).strip() for c in col if not str(c).startswith('Unnamed')]
-                            # Remove duplicate words (e.g., FIXED_FIXED_BASIC -> FIXED_BASIC)
-                            if len(parts) == 2 and parts[0].upper() == parts[1].split('_')[0].upper():
-                                new_cols.append(parts[1])
-                            else:
-                                new_cols.append('_'.join(parts).strip('_'))
-                        df.columns = new_cols
-                except:
-                    pass
-            else:
-                df = pd.read_excel(file_path)
+            # Handle multi-row headers by merging with next row if needed
+            # Check if next row has additional column names
+            try:
+                next_row_df = pd.read_excel(file_path, header=header_row+1, nrows=1)
+                next_cols = [str(c).lower() for c in next_row_df.columns]
+                # If next row has salary columns, merge the headers
+                if any('fixed' in c or 'earned' in c or 'deduction' in c for c in next_cols if not c.startswith('unnamed')):
+                    logger.info("Detected multi-row headers, merging row %d and %d", header_row, header_row + 1)
+                    # Read both rows as headers
+                    df = pd.read_excel(file_path, header=[header_row, header_row+1])
+                    # Flatten multi-level columns and remove duplicate prefixes
+                    new_cols = []
+                    for col in df.columns:
+                        parts = [str(c).strip() for c in col if not str(c).startswith('Unnamed')]
+                        # Remove duplicate words (e.g., FIXED_FIXED_BASIC -> FIXED_BASIC)
+                        if len(parts) == 2 and parts[0].upper() == parts[1].split('_')[0].upper():
+                            new_cols.append(parts[1])
+                        else:
+                            new_cols.append('_'.join(parts).strip('_'))
+                    df.columns = new_cols
+            except:
+                pass
         else:
-            return jsonify({"error": "Unsupported file type"}), 400
+            df = pd.read_excel(file_path)
+    else:
+        raise ValueError("Unsupported file type")
 
-        df.columns = df.columns.str.strip().str.replace('\ufeff', '')
-        
-        print(f"\n=== EXCEL COLUMNS DEBUG ===")
-        print(f"Total columns in Excel: {len(df.columns)}")
-        print(f"All columns: {list(df.columns)}")
-        print(f"=== END DEBUG ===\n")
-        
-        # Remove empty rows
-        df = df.dropna(how='all')
-        
-        # Validate ALL required columns BEFORE processing
-        required_columns = [
-            'Name', 'EMP_ID', 'Fixed_Basic', 'Fixed_DA', 'Fixed_HRA', 'Fixed_Total',
-            'Earned_Basic', 'Earned_DA', 'Earned_HRA', 'Earned_Total',
-            'PF', 'ESI', 'PT', 'Total_Deduction', 'Net_Pay'
-        ]
-        
-        # Create case-insensitive column mapping for validation
-        excel_cols_lower = {col.lower(): col for col in df.columns}
-        missing_required = []
-        
-        for col in required_columns:
-            col_lower = col.lower()
-            # Check if column exists (exact match or with prefix)
-            found = False
-            if col_lower in excel_cols_lower:
-                found = True
-            elif col_lower == 'pf' and 'deductions_pf' in excel_cols_lower:
-                found = True
-            elif col_lower == 'esi' and 'deductions_esi' in excel_cols_lower:
-                found = True
-            elif col_lower == 'pt' and 'deductions_pt' in excel_cols_lower:
+    df.columns = df.columns.str.strip().str.replace('\ufeff', '')
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Excel has %d columns: %s", len(df.columns), list(df.columns))
+
+    # Remove empty rows
+    df = df.dropna(how='all')
+    return df
+
+def load_employee_table(file_path, file_hash, filename):
+    """Return the normalized employee table for an upload, from the parsed cache when possible"""
+    df = load_cached_table(file_hash)
+    if df is not None:
+        logger.info("Using cached table for %s (%s)", filename, file_hash[:12])
+        return df
+    df = read_employee_file(file_path)
+    store_cached_table(file_hash, df)
+    return df
+
+REQUIRED_COLUMNS = [
+    'Name', 'EMP_ID', 'Fixed_Basic', 'Fixed_DA', 'Fixed_HRA', 'Fixed_Total',
+    'Earned_Basic', 'Earned_DA', 'Earned_HRA', 'Earned_Total',
+    'PF', 'ESI', 'PT', 'Total_Deduction', 'Net_Pay'
+]
+
+def find_missing_required(columns):
+    """Return the REQUIRED_COLUMNS that have no match (exact, prefixed or aliased) in columns"""
+    # Create case-insensitive column mapping for validation
+    excel_cols_lower = {col.lower(): col for col in columns}
+    missing_required = []
+    
+    for col in REQUIRED_COLUMNS:
+        col_lower = col.lower()
+        # Check if column exists (exact match or with prefix)
+        found = False
+        if col_lower in excel_cols_lower:
+            found = True
+        elif col_lower == 'pf' and 'deductions_pf' in excel_cols_lower:
+            found = True
+        elif col_lower == 'esi' and 'deductions_esi' in excel_cols_lower:
+            found = True
+        elif col_lower == 'pt' and 'deductions_pt' in excel_cols_lower:
+            found = True
+        elif col_lower == 'total_deduction' and 'deductions_total' in excel_cols_lower:
+            found = True
+        elif col_lower.startswith('fixed_'):
+            base_name = col_lower.replace('fixed_', '')
+            if base_name in excel_cols_lower or f'fixed_{base_name}' in excel_cols_lower:
                 found = True
-            elif col_lower == 'total_deduction' and 'deductions_total' in excel_cols_lower:
+        elif col_lower.startswith('earned_'):
+            base_name = col_lower.replace('earned_', '')
+            if base_name in excel_cols_lower or f'earned_{base_name}' in excel_cols_lower:
                 found = True
-            elif col_lower.startswith('fixed_'):
-                base_name = col_lower.replace('fixed_', '')
-                if base_name in excel_cols_lower or f'fixed_{base_name}' in excel_cols_lower:
-                    found = True
-            elif col_lower.startswith('earned_'):
-                base_name = col_lower.replace('earned_', '')
-                if base_name in excel_cols_lower or f'earned_{base_name}' in excel_cols_lower:
-                    found = True
-            
-            if not found:
-                missing_required.append(col)
         
-        if missing_required:
-            error_msg = f"❌ Cannot generate payslips.\n\nRequired columns missing: {', '.join(missing_required)}\n\n"
-            error_msg += f"Your Excel has: {', '.join(list(df.columns)[:20])}\n\n"
-            error_msg += "Please add ALL required columns and try again."
-            return jsonify({"error": error_msg}), 400
-        
-        # Create case-insensitive column mapping
-        col_map = {col: col for col in df.columns}
-        for col in df.columns:
-            col_map[col.lower()] = col
-            # Add aliases for common variations
-            col_lower = col.lower().replace(' ', '_')
-            col_map[col_lower] = col
-            
-            # Handle DEDUCTIONS_PF -> PF, DEDUCTIONS_ESI -> ESI, etc.
-            if 'deductions_' in col_lower:
-                col_map[col_lower.replace('deductions_', '')] = col
-            # Handle NET_PAY_EMAIL -> EMAIL, NET_PAY_phone_no -> phone
-            if 'net_pay_' in col_lower:
-                col_map[col_lower.replace('net_pay_', '')] = col
-            
-            # Specific mappings
-            if col_lower == 'total' or col_lower == 'deductions_total':
-                col_map['total_deduction'] = col
-            if col_lower == 'adv' or col_lower == 'deductions_adv':
-                col_map['lwf'] = col
-            if 'esi_no' in col_lower or 'esi no' in col_lower:
-                col_map['esi_no'] = col
-            if 'phone_no' in col_lower or 'phone no' in col_lower:
-                col_map['phone'] = col
-            if col_lower == 'email' or 'net_pay_email' in col_lower:
-                col_map['email'] = col
-            # Map EARNED_HRA.1 or EARNED_HRA.2 to Other_Allowance
-            if 'earned_hra.1' in col_lower or 'earned_hra.2' in col_lower:
-                col_map['other_allowance'] = col
-            # Map EARNED_Other_Allowance to Other_Allowance
-            if col_lower == 'earned_other_allowance':
-                col_map['other_allowance'] = col
-        
-        def get_col(name):
-            """Get column value with case-insensitive lookup"""
-            result = col_map.get(name.lower(), name)
-            if result == name and name.lower() not in col_map:
-                missing_columns.add(name)
-            return result
-        
-        missing_columns = set()
+        if not found:
+            missing_required.append(col)
+    return missing_required
+
+def build_col_map(columns):
+    """Create case-insensitive column mapping with aliases for common variations"""
+    col_map = {col: col for col in columns}
+    for col in columns:
+        col_map[col.lower()] = col
+        # Add aliases for common variations
+        col_lower = col.lower().replace(' ', '_')
+        col_map[col_lower] = col
         
-        print(f"Loaded {len(df)} employees from file")
-        print(f"Columns found: {list(df.columns)[:15]}...")  # Show first 15 columns
-        print(f"Total columns: {len(df.columns)}")
+        # Handle DEDUCTIONS_PF -> PF, DEDUCTIONS_ESI -> ESI, etc.
+        if 'deductions_' in col_lower:
+            col_map[col_lower.replace('deductions_', '')] = col
+        # Handle NET_PAY_EMAIL -> EMAIL, NET_PAY_phone_no -> phone
+        if 'net_pay_' in col_lower:
+            col_map[col_lower.replace('net_pay_', '')] = col
         
-        env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True)
-        template = env.get_template("payslip.html")
-        logo_base64 = get_logo_base64()
+        # Specific mappings
+        if col_lower == 'total' or col_lower == 'deductions_total':
+            col_map['total_deduction'] = col
+        if col_lower == 'adv' or col_lower == 'deductions_adv':
+            col_map['lwf'] = col
+        if 'esi_no' in col_lower or 'esi no' in col_lower:
+            col_map['esi_no'] = col
+        if 'phone_no' in col_lower or 'phone no' in col_lower:
+            col_map['phone'] = col
+        if col_lower == 'email' or 'net_pay_email' in col_lower:
+            col_map['email'] = col
+        # Map EARNED_HRA.1 or EARNED_HRA.2 to Other_Allowance
+        if 'earned_hra.1' in col_lower or 'earned_hra.2' in col_lower:
+            col_map['other_allowance'] = col
+        # Map EARNED_Other_Allowance to Other_Allowance
+        if col_lower == 'earned_other_allowance':
+            col_map['other_allowance'] = col
+    return col_map
 
-        preview = []
-        success_count = 0
-        error_count = 0
+def row_to_payslip(row, index, get_col):
+    """Build the payslip render context for one sheet row, or None if the row is empty"""
+    import pandas as pd
+    # Skip rows with no EMP_ID or Name
+    emp_id_val = row.get(get_col("EMP_ID"), f"EMP{index+1}")
+    name_val = row.get(get_col("Name"), "")
 
-        for index, row in df.iterrows():
-            try:
-                # Skip rows with no EMP_ID or Name
-                emp_id_val = row.get(get_col("EMP_ID"), f"EMP{index+1}")
-                name_val = row.get(get_col("Name"), "")
-                
-                print(f"Row {index+1}: EMP_ID={emp_id_val}, Name={name_val}")
-                
-                if pd.isna(emp_id_val) or pd.isna(name_val) or str(name_val).strip() == "":
-                    print(f"Skipping empty row {index+1} - EMP_ID: {emp_id_val}, Name: {name_val}")
-                    continue
-                
-                emp_id = str(emp_id_val).strip()
-                pay_month = month
-                print(f"Processing employee {emp_id}...")
-
-
-                salary_fixed = {
-                    "basic": get_numeric_value(row.get(get_col("Fixed_Basic"))),
-                    "da": get_numeric_value(row.get(get_col("Fixed_DA"))),
-                    "hra": get_numeric_value(row.get(get_col("Fixed_HRA"))),
-                    "leave_wages": 0,
-                    "others": 0,
-                    "bonus": get_numeric_value(row.get(get_col("Fixed_Bonus"))),
-                    "total": get_numeric_value(row.get(get_col("Fixed_Total"))),
-                }
-
-                salary_earned = {
-                    "basic": get_numeric_value(row.get(get_col("Earned_Basic"))),
-                    "da": get_numeric_value(row.get(get_col("Earned_DA"))),
-                    "hra": get_numeric_value(row.get(get_col("Earned_HRA"))),
-                    "leave_wages": get_numeric_value(row.get(get_col("Earned_Leave_Wages"))),
-                    "others": get_numeric_value(row.get(get_col("Other_Allowance"))),
-                    "bonus": get_numeric_value(row.get(get_col("Earned_Bonus"))),
-                    "total": get_numeric_value(row.get(get_col("Earned_Total"))),
-                }
-
-                deduction = {
-                    "pf": get_numeric_value(row.get(get_col("PF"))),
-                    "esi": get_numeric_value(row.get(get_col("ESI"))),
-                    "pt": get_numeric_value(row.get(get_col("PT"))),
-                    "lwf": get_numeric_value(row.get(get_col("LWF"))),
-                    "adv": 0,
-                    "total": get_numeric_value(row.get(get_col("Total_Deduction"))),
-                }
-
-                net_pay = get_numeric_value(row.get(get_col("Net_Pay")))
-                net_pay_words = number_to_words(net_pay)
-
-                emp_data = {
-                    "emp_id": emp_id,
-                    "name": str(row.get(get_col("Name"), "")).strip(),
-                    "designation": str(row.get(get_col("Designation"), "")).strip(),
-                    "unit_name": str(row.get(get_col("Unit_Name"), "")).strip(),
-                    "uan": str(int(float(row.get(get_col("UAN_No"), 0)))) if pd.notna(row.get(get_col("UAN_No"))) else "",
-                    "esi": str(row.get(get_col("ESI_No"), "")).strip(),
-                    "doj": str(row.get(get_col("DOJ"), "")).strip(),
-                    "bank_ac": str(int(float(row.get(get_col("Bank_AC"), 0)))) if pd.notna(row.get(get_col("Bank_AC"))) else "",
-                    "ifsc": str(row.get(get_col("IFSC_Code"), "")).strip(),
-                    "email": str(row.get(get_col("Email"), "")).strip(),
-                    "phone": str(row.get(get_col("Phone"), "")).strip(),
-                    "basic_days": str(int(float(row.get(get_col("Basic_Days"), 31)))) if pd.notna(row.get(get_col("Basic_Days"))) else "31",
-                    "actual_days": str(int(float(row.get(get_col("Actual_Days"), 31)))) if pd.notna(row.get(get_col("Actual_Days"))) else "31",
-                }
-
-                html_content = template.render(
-                    company=COMPANY, emp=emp_data, salary_fixed=salary_fixed,
-                    salary_earned=salary_earned, deduction=deduction, net_pay=net_pay,
-                    net_pay_words=net_pay_words, month=pay_month,
-                    generated_on=datetime.now().strftime("%d %b %Y"), logo_base64=logo_base64
-                )
-
-                html_path = os.path.join(OUTPUT_DIR, f"{emp_id}.html")
-                pdf_path = os.path.join(OUTPUT_DIR, f"{emp_id}.pdf")
-
-                with open(html_path, "w", encoding="utf-8") as f:
-                    f.write(html_content)
-
-                result = subprocess.run([WKHTMLTOPDF_CMD, "--enable-local-file-access", "--page-size", "A4",
-                    "--margin-top", "10mm", "--margin-bottom", "10mm", "--margin-left", "10mm",
-                    "--margin-right", "10mm", html_path, pdf_path], capture_output=True, text=True, timeout=30)
-
-                if result.returncode != 0:
-                    print(f"ERROR: wkhtmltopdf failed for {emp_id}")
-                    print(f"STDOUT: {result.stdout}")
-                    print(f"STDERR: {result.stderr}")
-                    error_count += 1
-                    continue
-                    
-                if not os.path.exists(pdf_path):
-                    print(f"ERROR: PDF not created for {emp_id}")
-                    error_count += 1
-                    continue
+    if pd.isna(emp_id_val) or pd.isna(name_val) or str(name_val).strip() == "":
+        logger.debug("Skipping empty row %d - EMP_ID: %s, Name: %s", index + 1, emp_id_val, name_val)
+        return None
 
-                try:
-                    print(f"DEBUG: Storing to S3 with year/month folder: {year}/{pay_month}")
-                    s3_key = upload_to_s3(pdf_path, month=pay_month, year=year)
-                    print(f"DEBUG: S3 key created: {s3_key}")
-                    current_session_pdfs.append(s3_key)
-                except Exception as s3_error:
-                    print(f"S3 upload failed: {s3_error}")
-
-                preview.append({"EMP_ID": emp_id, "Name": emp_data["name"], "Designation": emp_data["designation"],
-                    "Email": emp_data["email"], "Net_Pay": net_pay, "PDF_Path": pdf_path})
-                success_count += 1
-
-            except subprocess.TimeoutExpired:
-                print(f"ERROR: Timeout for employee {emp_id}")
-                error_count += 1
-                continue
-            except Exception as emp_error:
-                print(f"ERROR processing {emp_id}: {str(emp_error)}")
-                print(f"Traceback: {traceback.format_exc()}")
-                error_count += 1
-                continue
+    emp_id = str(emp_id_val).strip()
+    logger.debug("Row %d: EMP_ID=%s, Name=%s", index + 1, emp_id, name_val)
 
-        print(f"\nGENERATION COMPLETE - Success: {success_count}/{len(df)}, Errors: {error_count}/{len(df)}\n")
+    salary_fixed = {
+        "basic": get_numeric_value(row.get(get_col("Fixed_Basic"))),
+        "da": get_numeric_value(row.get(get_col("Fixed_DA"))),
+        "hra": get_numeric_value(row.get(get_col("Fixed_HRA"))),
+        "leave_wages": 0,
+        "others": 0,
+        "bonus": get_numeric_value(row.get(get_col("Fixed_Bonus"))),
+        "total": get_numeric_value(row.get(get_col("Fixed_Total"))),
+    }
 
-        if success_count == 0:
-            error_msg = "❌ No payslips generated.\n\n"
-            if missing_columns:
-                missing_list = sorted(list(missing_columns))
-                error_msg += f"Missing columns in your Excel: {', '.join(missing_list)}\n\n"
-                error_msg += "Please add these columns and try again."
-            else:
-                error_msg += "All rows were skipped. Check if your Excel has data."
-            return jsonify({"error": error_msg}), 500
-        
-        # Show missing columns warning to user
-        warning_msg = ""
-        if missing_columns:
+    salary_earned = {
+        "basic": get_numeric_value(row.get(get_col("Earned_Basic"))),
+        "da": get_numeric_value(row.get(get_col("Earned_DA"))),
+        "hra": get_numeric_value(row.get(get_col("Earned_HRA"))),
+        "leave_wages": get_numeric_value(row.get(get_col("Earned_Leave_Wages"))),
+        "others": get_numeric_value(row.get(get_col("Other_Allowance"))),
+        "bonus": get_numeric_value(row.get(get_col("Earned_Bonus"))),
+        "total": get_numeric_value(row.get(get_col("Earned_Total"))),
+    }
+
+    deduction = {
+        "pf": get_numeric_value(row.get(get_col("PF"))),
+        "esi": get_numeric_value(row.get(get_col("ESI"))),
+        "pt": get_numeric_value(row.get(get_col("PT"))),
+        "lwf": get_numeric_value(row.get(get_col("LWF"))),
+        "adv": 0,
+        "total": get_numeric_value(row.get(get_col("Total_Deduction"))),
+    }
+
+    net_pay = get_numeric_value(row.get(get_col("Net_Pay")))
+    net_pay_words = number_to_words(net_pay)
+
+    emp_data = {
+        "emp_id": emp_id,
+        "name": str(row.get(get_col("Name"), "")).strip(),
+        "designation": str(row.get(get_col("Designation"), "")).strip(),
+        "unit_name": str(row.get(get_col("Unit_Name"), "")).strip(),
+        "uan": str(int(float(row.get(get_col("UAN_No"), 0)))) if pd.notna(row.get(get_col("UAN_No"))) else "",
+        "esi": str(row.get(get_col("ESI_No"), "")).strip(),
+        "doj": str(row.get(get_col("DOJ"), "")).strip(),
+        "bank_ac": str(int(float(row.get(get_col("Bank_AC"), 0)))) if pd.notna(row.get(get_col("Bank_AC"))) else "",
+        "ifsc": str(row.get(get_col("IFSC_Code"), "")).strip(),
+        "email": str(row.get(get_col("Email"), "")).strip(),
+        "phone": str(row.get(get_col("Phone"), "")).strip(),
+        "basic_days": str(int(float(row.get(get_col("Basic_Days"), 31)))) if pd.notna(row.get(get_col("Basic_Days"))) else "31",
+        "actual_days": str(int(float(row.get(get_col("Actual_Days"), 31)))) if pd.notna(row.get(get_col("Actual_Days"))) else "31",
+    }
+
+    return {"emp": emp_data, "salary_fixed": salary_fixed, "salary_earned": salary_earned,
+            "deduction": deduction, "net_pay": net_pay, "net_pay_words": net_pay_words}
+
+@app.after_request
+def compress_json(response):
+    """Gzip larger JSON bodies (run previews, send results) for clients that accept it"""
+    if (response.mimetype != "application/json" or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or "gzip" not in request.headers.get("Accept-Encoding", "")):
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers["Content-Encoding"] = "gzip"
+    response.headers.add("Vary", "Accept-Encoding")
+    return response
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    start_warm_up()
+    status = {"ready": _warmup["done"] and not _warmup["error"], "warm_ms": _warmup["components"],
+              "error": _warmup["error"]}
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route("/")
+def dashboard():
+    return render_template("dashboard.html")
+
+def generate_payslips(file_path, file_hash, filename, month, year, render_mode=RENDER_MODE, notify=False,
+                      restart=False, job=None):
+    """Run generation for a saved upload and return the JSON response for it.
+
+    Local runs checkpoint every row (rendered, stored, emailed), so calling
+    this again for the same workbook and pay period skips finished work;
+    restart=True regenerates from scratch. With a scheduler job, wkhtmltopdf
+    and SMTP calls wait for a fair-share slot.
+    """
+    if render_mode == "queue" and notify:
+        # Workers only render and store; there is no notify stage to run after them
+        return jsonify({"error": "send_emails can't be combined with queued rendering. Upload without it, "
+                                 "then call /send-emails with the run_id once the run has finished."}), 400
+    try:
+        df = load_employee_table(file_path, file_hash, filename)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    missing_required = find_missing_required(df.columns)
+    if missing_required:
+        error_msg = f"❌ Cannot generate payslips.\n\nRequired columns missing: {', '.join(missing_required)}\n\n"
+        error_msg += f"Your Excel has: {', '.join(list(df.columns)[:20])}\n\n"
+        error_msg += "Please add ALL required columns and try again."
+        return jsonify({"error": error_msg}), 400
+
+    col_map = build_col_map(df.columns)
+
+    def get_col(name):
+        """Get column value with case-insensitive lookup"""
+        result = col_map.get(name.lower(), name)
+        if result == name and name.lower() not in col_map:
+            missing_columns.add(name)
+        return result
+    
+    missing_columns = set()
+    
+    logger.info("Loaded %d employees from %s (%d columns)", len(df), filename, len(df.columns))
+    
+    run_id = make_run_id(file_hash, year, month)
+    if render_mode == "queue" and not get_queue().run_status(run_id)["finished"]:
+        return run_in_progress(run_id)
+    if not start_run(run_id, file_hash, file_path, filename, month, year, notify, restart=restart):
+        # Started by another request or replica that is still making progress
+        return run_in_progress(run_id)
+    checkpoints = {}
+    if render_mode != "queue":
+        checkpoints = load_checkpoints(run_id)
+        if checkpoints:
+            logger.info("Resuming run %s: %d row(s) have checkpoints", run_id, len(checkpoints))
+
+    def normalize_stage(item):
+        slip = row_to_payslip(item["row"], item["index"], get_col)
+        if slip is None:
+            return None
+        cp = checkpoints.get(int(item["index"]), {})
+        done_pdf = cp.get("rendered") and cp.get("pdf_path") and os.path.exists(cp["pdf_path"])
+        # A stored slip only needs its local PDF again if it still has to be emailed
+        needs_pdf = not cp.get("stored") or (notify and not cp.get("emailed"))
+        return {"index": item["index"], "emp_id": slip["emp"]["emp_id"], "slip": slip, "checkpoint": cp,
+                "skip_render": bool(done_pdf or not needs_pdf), "pdf_path": cp.get("pdf_path"), "skipped": []}
+
+    def html_stage(item):
+        if item["skip_render"]:
+            item["skipped"].append("rendered")
+            return item
+        item["html_path"] = write_html(item["slip"], month, html_dir(run_id))
+        return item
+
+    def pdf_stage(item):
+        if item["skip_render"]:
+            if item["pdf_path"] and os.path.exists(item["pdf_path"]):
+                item["pdf_bytes_raw"] = item["pdf_bytes"] = os.path.getsize(item["pdf_path"])
+            return item
+        # Created on first render so a rejected upload leaves no empty run directory
+        os.makedirs(pdf_dir(run_id), exist_ok=True)
+        try:
+            with scheduler.slot(job, "renderer"):
+                item["pdf_path"] = convert_to_pdf(item["emp_id"], item["html_path"], pdf_dir(run_id))
+        except CircuitOpenError as e:
+            # Every remaining row would fail the same way; stop and let the run be resumed later
+            pipeline.abort(str(e))
+            raise
+        finally:
+            discard(item.pop("html_path"))
+        item["pdf_bytes_raw"] = item["pdf_bytes"] = os.path.getsize(item["pdf_path"])
+        mark(run_id, item["index"], item["emp_id"], "rendered", pdf_path=item["pdf_path"])
+        return item
+
+    def optimize_stage(item):
+        if item["skip_render"]:
+            return item
+        item["pdf_bytes_raw"], item["pdf_bytes"] = optimize_pdf(item["pdf_path"])
+        return item
+
+    def store_stage(item):
+        cp = item["checkpoint"]
+        if cp.get("stored"):
+            item["skipped"].append("stored")
+            item["s3_key"] = cp["s3_key"]
+            return item
+        try:
+            s3_key = upload_to_s3(item["pdf_path"], month=month, year=year)
+            logger.debug("Stored %s as %s", item["emp_id"], s3_key)
+            item["s3_key"] = s3_key
+            mark(run_id, item["index"], item["emp_id"], "stored", s3_key=s3_key)
+        except Exception as s3_error:
+            logger.error("S3 upload failed for %s: %s", item["emp_id"], s3_error)
+        return item
+
+    def notify_stage(item):
+        if item["checkpoint"].get("emailed"):
+            item["skipped"].append("emailed")
+            item["email_status"] = "Sent"
+            return item
+        emp = item["slip"]["emp"]
+        sent = False
+        if emp["email"]:
+            # Another run of the same sheet may be mailing this row right now
+            if not claim_email(run_id, item["index"], item["emp_id"]):
+                item["skipped"].append("emailed")
+                return item
+            with scheduler.slot(job, "smtp"):
+                sent = send_email(emp["email"], emp["name"], item["pdf_path"], month, s3_key=item.get("s3_key"))
+            if not sent:
+                release_email(run_id, item["index"])
+        item["email_status"] = "Sent" if sent else "Failed"
+        if sent:
+            mark(run_id, item["index"], item["emp_id"], "emailed")
+        return item
+
+    stages = [Stage("normalize", normalize_stage, NORMALIZE_WORKERS)]
+    if render_mode != "queue":
+        stages += [Stage("render_html", html_stage, HTML_WORKERS),
+                   Stage("pdf", pdf_stage, PDF_WORKERS)]
+        if PDF_POSTPROCESS:
+            stages.append(Stage("optimize", optimize_stage, OPTIMIZE_WORKERS))
+        stages.append(Stage("store", store_stage, STORE_WORKERS))
+        if notify:
+            stages.append(Stage("notify", notify_stage, NOTIFY_WORKERS))
+
+    pipeline = Pipeline(f"upload-{file_hash[:12]}-{datetime.now().strftime('%H%M%S%f')}", stages,
+                        queue_size=PIPELINE_QUEUE_SIZE)
+    results = pipeline.run({"index": index, "row": row} for index, row in df.iterrows())
+    results.sort(key=lambda item: item["index"])
+
+    for err in pipeline.errors:
+        extra = {"stage": err["stage"], "emp_id": err["item"].get("emp_id")}
+        if err["stage"] != "pdf":
+            extra["traceback"] = err["traceback"]
+        logger.error("Error processing %s in %s: %s", extra["emp_id"], err["stage"], err["error"], extra=extra)
+
+    success_count = len(results)
+    error_count = len(pipeline.errors)
+    preview = [preview_entry(item, "queued" if render_mode == "queue" else "generated") for item in results]
+    preview += [preview_entry(err["item"], "failed", err["error"]) for err in pipeline.errors]
+    preview.sort(key=lambda entry: entry["Row"])
+    history_records = [make_record(item["slip"]) for item in results]
+    queued_slips = [item["slip"] for item in results]
+
+    logger.info("Generation complete - success: %d/%d, errors: %d/%d", success_count, len(df), error_count, len(df),
+                extra={"rows": len(df), "success": success_count, "errors": error_count})
+
+    resumed = {step: sum(step in item["skipped"] for item in results) for step in CHECKPOINT_STEPS}
+    if render_mode == "queue":
+        if not success_count:
+            finish_run(run_id, "failed")
+    else:
+        finish_run(run_id, "aborted" if pipeline.aborted else
+                   "completed" if error_count == 0 else "completed_with_errors")
+        if any(resumed.values()):
+            logger.info("Resumed run %s: skipped %s", run_id, resumed)
+
+    if success_count == 0:
+        error_msg = "❌ No payslips generated.\n\n"
+        if pipeline.aborted:
+            error_msg += f"The run was stopped: {pipeline.abort_reason}. Resume it once the renderer is healthy."
+        elif missing_columns:
             missing_list = sorted(list(missing_columns))
-            warning_msg = f"Warning: The following columns were not found in your Excel file: {', '.join(missing_list)}. These fields will be empty in the payslips."
-            print(f"\n{warning_msg}\n")
+            error_msg += f"Missing columns in your Excel: {', '.join(missing_list)}\n\n"
+            error_msg += "Please add these columns and try again."
+        else:
+            error_msg += "All rows were skipped. Check if your Excel has data."
+        return jsonify({"error": error_msg}), 500
+    
+    try:
+        append_run(history_records, year, month, run_id=run_id)
+    except Exception as history_error:
+        logger.error("Payroll history append failed: %s", history_error)
 
+    if render_mode != "queue":
+        try:
+            record_slips(year, month, run_id,
+                         ((item["emp_id"], item.get("s3_key"), item.get("pdf_bytes")) for item in results))
+        except Exception as index_error:
+            logger.error("Payslip index update failed: %s", index_error)
+        if DOWNLOAD_DELIVERY == "presigned":
+            # Have the month archive ready before anyone asks for it
+            try:
+                refresh_month_archive(month=month, year=year)
+            except Exception as archive_error:
+                logger.error("Archive refresh failed: %s", archive_error)
+
+    # Show missing columns warning to user
+    warning_msg = ""
+    if missing_columns:
+        missing_list = sorted(list(missing_columns))
+        warning_msg = f"Warning: The following columns were not found in your Excel file: {', '.join(missing_list)}. These fields will be empty in the payslips."
+        logger.warning(warning_msg)
+
+    if render_mode == "queue":
+        chunks = [queued_slips[i:i + RENDER_CHUNK_SIZE] for i in range(0, len(queued_slips), RENDER_CHUNK_SIZE)]
+        get_queue().enqueue(run_id, [{"run_id": run_id, "month": month, "year": year, "slips": chunk} for chunk in chunks],
+                            submitter=job.submitter if job else None, priority=job.priority if job else 0)
+        logger.info("Queued %d payslip(s) in %d task(s) for run %s", success_count, len(chunks), run_id)
+        # Rendering continues on the workers; /runs/<run_id>/status follows the tasks
+        finish_run(run_id, "queued")
+        save_preview(run_id, preview)
         return jsonify({
-            "message": f"Generated {success_count} payslip(s)", 
-            "preview": preview,
+            "message": f"Queued {success_count} payslip(s) for rendering",
+            "run_id": run_id,
+            "preview": preview[:PREVIEW_PAGE_SIZE],
+            "preview_total": len(preview),
+            "preview_url": f"/runs/{run_id}/preview",
             "warning": warning_msg if missing_columns else None
-        })
+        }), 202
+
+    message = f"Generated {success_count} payslip(s)"
+    if any(resumed.values()):
+        # Same workbook and pay period as an earlier run: say what was reused rather than redone
+        message += (f" (resumed an earlier run: {resumed['rendered']} already rendered, "
+                    f"{resumed['stored']} already stored; start over (restart=1) to regenerate them)")
+
+    save_preview(run_id, preview)
+    return jsonify({
+        "message": message,
+        "run_id": run_id,
+        "aborted": pipeline.abort_reason,
+        "resumed": resumed,
+        # The first page only; the rest comes from /runs/<run_id>/preview
+        "preview": preview[:PREVIEW_PAGE_SIZE],
+        "preview_total": len(preview),
+        "preview_url": f"/runs/{run_id}/preview",
+        "warning": warning_msg if missing_columns else None,
+        "pipeline": pipeline.stats(),
+        "schedule": scheduler.describe(job) if job else None,
+        "pdf_sizes": pdf_size_summary(results)
+    })
+
+
+@app.route("/upload", methods=["POST"])
+@profiled("upload")
+def upload_file():
+    try:
+        if "csv_file" not in request.files:
+            return jsonify({"error": "No file uploaded"}), 400
+
+        file = request.files["csv_file"]
+        month = request.form.get("month", "NA")
+        year = request.form.get("year", str(datetime.now().year))
+        filename = secure_filename(file.filename)
+        file_path, file_hash = save_upload(file, UPLOAD_DIR, filename)
+
+        run_id = make_run_id(file_hash, year, month)
+        if run_is_active(run_id):
+            return run_in_progress(run_id)
+        with run_context(run_id), scheduler.job(run_id, submitter_of(), requested_priority()) as job, \
+                run_scratch(run_id, file_path):
+            logger.info("Starting payslip generation for %s (%s %s)", filename, month, year)
+            return generate_payslips(file_path, file_hash, filename, month, year,
+                                     render_mode=request.form.get("render_mode", RENDER_MODE),
+                                     notify=is_truthy(request.form.get("send_emails")),
+                                     restart=is_truthy(request.form.get("restart")), job=job)
 
     except Exception as e:
-        print(f"\nFATAL ERROR: {traceback.format_exc()}\n")
+        logger.exception("Upload failed")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/validate", methods=["POST"])
+def validate_upload():
+    """Dry run: check a workbook's columns and rows without rendering, storing or emailing"""
+    try:
+        start = time.perf_counter()
+        if "csv_file" not in request.files:
+            return jsonify({"error": "No file uploaded"}), 400
+
+        file = request.files["csv_file"]
+        filename = secure_filename(file.filename)
+        file_path, file_hash = save_upload(file, UPLOAD_DIR, filename)
+        try:
+            df = load_employee_table(file_path, file_hash, filename)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        missing_required = find_missing_required(df.columns)
+        report = validate_table(df, build_col_map(df.columns))
+        report["missing_required"] = missing_required
+        report["valid"] = not missing_required and report["problem_count"] == 0
+        report["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info("Validated %s: %d rows, %d problem(s), %d missing required column(s) in %s ms", filename,
+                    report["rows"], report["problem_count"], len(missing_required), report["elapsed_ms"])
+        return jsonify(report)
+    except Exception as e:
+        logger.exception("Validation failed")
         return jsonify({"error": str(e)}), 500
 
 @app.route("/send-emails", methods=["POST"])
+@profiled("send")
 def send_emails():
+    job = None
     try:
         data = request.get_json()
-        employees = data.get("employees", [])
+        run_id = data.get("run_id")
         month = data.get("month", "")
+        if run_id:
+            # Selection within a stored run preview instead of the full employee list
+            run = get_run(run_id)
+            queued = bool(run) and run["status"] == "queued"
+            employees = select_preview(run_id, emp_ids=data.get("emp_ids"), unit=data.get("unit"),
+                                       status=data.get("status", "queued" if queued else "generated"),
+                                       email_status=data.get("email_status"))
+            if queued:
+                # Render workers record what they stored in the slip index, not in the preview
+                for emp in employees:
+                    if not emp.get("S3_Key"):
+                        entry = find_slip(run["year"], run["month"], emp["EMP_ID"])
+                        emp["S3_Key"] = entry["s3_key"] if entry else None
+            if not month:
+                month = run["month"] if run else ""
+        else:
+            employees = data.get("employees", [])
 
         if not employees:
             return jsonify({"error": "No employee data"}), 400
 
-        sent_count = 0
-        failed_count = 0
-        results = []
+        send_id = run_id or f"send-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        with run_context(send_id):
+            job = scheduler.register(send_id, submitter_of(), requested_priority(), kind="email")
+            sent_count = 0
+            failed_count = 0
+            results = []
 
-        for emp in employees:
-            emp_email = emp.get("Email")
-            emp_name = emp.get("Name")
-            emp_id = emp.get("EMP_ID")
-            pdf_path = emp.get("PDF_Path")
+            for emp in employees:
+                emp_email = emp.get("Email")
+                emp_name = emp.get("Name")
+                emp_id = emp.get("EMP_ID")
+                pdf_path = emp.get("PDF_Path")
+                s3_key = emp.get("S3_Key")
+                # Link emails only need the S3 copy, not the local PDF
+                by_link = EMAIL_DELIVERY == "link" and bool(s3_key)
 
-            if not emp_email or not pdf_path:
-                failed_count += 1
-                results.append({"EMP_ID": emp_id, "Status": "Failed", "Reason": "Missing data"})
-                continue
-
-            if not os.path.exists(pdf_path):
-                pdf_path = os.path.join(OUTPUT_DIR, f"{emp_id}.pdf")
-                if not os.path.exists(pdf_path):
+                if not emp_email or not (pdf_path or s3_key):
                     failed_count += 1
-                    results.append({"EMP_ID": emp_id, "Status": "Failed", "Reason": "PDF not found"})
+                    results.append({"EMP_ID": emp_id, "Status": "Failed", "Reason": "Missing data"})
                     continue
 
-            success = send_email(emp_email, emp_name, pdf_path, month)
-            if success:
-                sent_count += 1
-                results.append({"EMP_ID": emp_id, "Status": "Sent", "Email": emp_email})
-            else:
-                failed_count += 1
-                results.append({"EMP_ID": emp_id, "Status": "Failed", "Email": emp_email})
+                if not by_link and not (pdf_path and os.path.exists(pdf_path)):
+                    pdf_path = os.path.join(pdf_dir(run_id) if run_id else OUTPUT_DIR, f"{emp_id}.pdf")
+                    if not os.path.exists(pdf_path) and s3_key:
+                        # The run's local PDFs were evicted from scratch space; the stored copy is the same slip
+                        try:
+                            os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+                            download_from_s3(s3_key, pdf_path)
+                        except Exception as e:
+                            logger.warning("Could not fetch %s for %s: %s", s3_key, emp_id, e)
+                    if not os.path.exists(pdf_path):
+                        failed_count += 1
+                        results.append({"EMP_ID": emp_id, "Status": "Failed", "Reason": "PDF not found"})
+                        continue
 
-        return jsonify({"message": f"Sent {sent_count}, failed {failed_count}", "sent_count": sent_count,
-            "failed_count": failed_count, "results": results})
+                with scheduler.slot(job, "smtp"):
+                    success = send_email(emp_email, emp_name, pdf_path, month, s3_key=s3_key)
+                if success:
+                    sent_count += 1
+                    results.append({"EMP_ID": emp_id, "Status": "Sent", "Email": emp_email})
+                else:
+                    failed_count += 1
+                    results.append({"EMP_ID": emp_id, "Status": "Failed", "Email": emp_email})
+
+            if run_id:
+                statuses = {emp["Row"]: "sent" if result["Status"] == "Sent" else "failed"
+                            for emp, result in zip(employees, results)}
+                set_email_status(run_id, statuses)
+                for emp, result in zip(employees, results):
+                    if result["Status"] == "Sent":
+                        mark(run_id, emp["Row"] - 1, emp["EMP_ID"], "emailed")
+                # Statuses are in the run preview now; only report the failures
+                results = [dict(result, Row=emp["Row"]) for emp, result in zip(employees, results)
+                           if result["Status"] != "Sent"]
+
+            return jsonify({"message": f"Sent {sent_count}, failed {failed_count}", "sent_count": sent_count,
+                "failed_count": failed_count, "results": results})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if job is not None:
+            scheduler.unregister(job)
+
+@app.route("/pipeline/stats", methods=["GET"])
+def pipeline_stats():
+    return jsonify({"pipelines": active_stats()})
+
+@app.route("/renderer/health", methods=["GET"])
+def renderer_health():
+    """wkhtmltopdf latency, adaptive timeout, failure counters and circuit breaker state"""
+    return jsonify(supervisor.stats())
+
+@app.route("/scratch", methods=["GET"])
+def scratch_status():
+    """Local disk used by run PDFs, uploads and HTML intermediates, with limits and eviction counters"""
+    return jsonify(scratch_usage())
+
+@app.route("/scheduler", methods=["GET"])
+def scheduler_status():
+    """Renderer/SMTP slot usage and every waiting job's queue position and expected wait"""
+    return jsonify(scheduler.snapshot())
+
+def describe_run(run_id):
+    """Queue or checkpoint progress of a run plus its scheduler slots, or None if unknown"""
+    queue = get_queue()
+    status = queue.run_status(run_id)
+    if status["tasks"] == 0:
+        status = run_progress(run_id)
+        if status is None:
+            return None
+    else:
+        status["queue"] = queue.queue_position(run_id)
+    status["schedule"] = scheduler.job_status(run_id)
+    return status
+
+def run_in_progress(run_id):
+    """409 for a second request to start a run that is still going"""
+    logger.warning("Run %s is already in progress; not starting it again", run_id)
+    return jsonify({"error": "This sheet is already being processed for this pay period. "
+                             "Follow its progress instead of uploading it again.",
+                    "run_id": run_id, "status_url": f"/runs/{run_id}/status",
+                    "run": describe_run(run_id)}), 409
+
+@app.route("/runs/<run_id>/status", methods=["GET"])
+def run_status(run_id):
+    try:
+        status = describe_run(run_id)
+        if status is None:
+            return jsonify({"error": "Unknown run"}), 404
+        return jsonify(status)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/runs/<run_id>/preview", methods=["GET"])
+def run_preview(run_id):
+    """Paged, sortable preview of a run; filter with unit, status, email_status or q (EMP_ID/Name)"""
+    try:
+        args = request.args
+        page = query_preview(run_id, page=args.get("page", 1, type=int), per_page=args.get("per_page", 50, type=int),
+                             sort=args.get("sort", "Row"), order=args.get("order", "asc"), unit=args.get("unit"),
+                             status=args.get("status"), email_status=args.get("email_status"), search=args.get("q"))
+        if page is None:
+            return jsonify({"error": "No preview for this run"}), 404
+        return jsonify(page)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/runs/<run_id>/resume", methods=["POST"])
+@profiled("resume")
+def resume_run(run_id):
+    """Continue a crashed or timed-out run from its checkpoints using the stored upload"""
+    try:
+        run = get_run(run_id)
+        if run is None:
+            return jsonify({"error": "Unknown run"}), 404
+        # The parsed table is all generation needs, so an evicted upload is fine while it is cached
+        if not os.path.exists(run["file_path"]) and not has_cached_table(run["file_hash"]):
+            return jsonify({"error": "The uploaded file for this run is no longer available"}), 410
+        if run_is_active(run_id):
+            return run_in_progress(run_id)
+
+        with run_context(run_id), scheduler.job(run_id, submitter_of(), requested_priority()) as job, \
+                run_scratch(run_id, run["file_path"]):
+            logger.info("Resuming run %s", run_id)
+            return generate_payslips(run["file_path"], run["file_hash"], run["filename"], run["month"], run["year"],
+                                     notify=bool(run["notify"]), job=job)
+    except Exception as e:
+        logger.exception("Resume of run %s failed", run_id)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/runs/<run_id>/bundles", methods=["POST"])
+@profiled("bundle")
+def build_run_bundles(run_id):
+    """Merge a run's generated slips into one printable PDF per Unit_Name, or per any group_by column.
+
+    Existing PDFs are concatenated (no wkhtmltopdf) and stored in S3 as
+    {year}/{month}/units/<group>.pdf. Body: group_by, optional groups (values
+    to build), and year/month for queued runs.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        group_by = data.get("group_by") or "Unit_Name"
+        run = get_run(run_id)
+        year = data.get("year") or (run["year"] if run else None)
+        month = data.get("month") or (run["month"] if run else None)
+        if not (year and month):
+            return jsonify({"error": "year and month are required for this run"}), 400
+
+        slips = [s for s in select_preview(run_id) if s["Status"] != "failed"]
+        if not slips:
+            return jsonify({"error": "No generated payslips for this run"}), 404
+
+        field = next((f for f in PREVIEW_FIELDS if f.lower() == group_by.lower()), None)
+        if field:
+            values = {s["Row"]: s[field] for s in slips}
+        else:
+            # Not kept in the preview; read it from the run's workbook
+            if run is None or not os.path.exists(run["file_path"]):
+                return jsonify({"error": f"Grouping by {group_by} needs the run's uploaded workbook"}), 410
+            df = load_employee_table(run["file_path"], run["file_hash"], run["filename"])
+            column = build_col_map(df.columns).get(group_by.lower())
+            if column is None:
+                return jsonify({"error": f"Unknown group_by column: {group_by}"}), 400
+            values = {s["Row"]: df.at[s["Row"] - 1, column] for s in slips}
+
+        wanted = {str(g) for g in data.get("groups") or []}
+        groups = {}
+        for slip in slips:
+            value = values[slip["Row"]]
+            value = "Unassigned" if value is None or value != value or str(value).strip() == "" else str(value).strip()
+            if wanted and value not in wanted:
+                continue
+            if not slip.get("S3_Key"):
+                # Queued runs: the render workers recorded the key in the slip index
+                entry = find_slip(year, month, slip["EMP_ID"])
+                slip["S3_Key"] = entry["s3_key"] if entry else None
+            groups.setdefault(value, []).append(slip)
+        if not groups:
+            return jsonify({"error": "No payslips in the requested groups"}), 404
+
+        try:
+            bundles = build_bundles(dict(sorted(groups.items())), year, month)
+        except ImportError:
+            return jsonify({"error": "Combined PDFs need pikepdf (pip install pikepdf)"}), 501
+        for bundle in bundles:
+            if bundle["s3_key"]:
+                bundle["url"] = presigned_url(bundle["s3_key"], download_name=f"{bundle['name']}_{month}_{year}.pdf")
+        return jsonify({"run_id": run_id, "group_by": group_by, "bundles": bundles})
+    except Exception as e:
+        logger.exception("Building bundles for run %s failed", run_id)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/runs/<run_id>/profiles", methods=["GET"])
+def run_profiles(run_id):
+    if not is_admin():
+        return jsonify({"error": "Admin token required"}), 403
+    return jsonify({"run_id": run_id, "profiles": list_profiles(run_id)})
+
+@app.route("/runs/<run_id>/profiles/<name>", methods=["GET"])
+def download_profile(run_id, name):
+    if not is_admin():
+        return jsonify({"error": "Admin token required"}), 403
+    path = profile_path(run_id, name)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, as_attachment=True, download_name=name)
 
 @app.route("/download-current", methods=["GET"])
+@profiled("download")
 def download_current_session():
     try:
-        if not current_session_pdfs:
+        run_id = request.args.get("run_id")
+        if not run_id:
+            return jsonify({"error": "run_id is required"}), 400
+        status = get_queue().run_status(run_id)
+        if status["tasks"]:
+            s3_keys = status["s3_keys"]
+        else:
+            # Rendered in-process: the run's own preview records what was stored
+            s3_keys = [e["S3_Key"] for e in select_preview(run_id) if e.get("S3_Key")] or \
+                [cp["s3_key"] for _, cp in sorted(load_checkpoints(run_id).items()) if cp.get("s3_key")]
+        if not s3_keys:
             return jsonify({"error": "No PDFs in current session"}), 404
 
         zip_buffer = io.BytesIO()
         with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for s3_key in current_session_pdfs:
+            for s3_key in s3_keys:
                 pdf_data = download_s3_file_to_memory(s3_key)
                 zipf.writestr(os.path.basename(s3_key), pdf_data.read())
 
@@ -547,13 +1147,28 @@ def download_current_session():
         return jsonify({"error": str(e)}), 500
 
 @app.route("/download", methods=["GET"])
+@profiled("download")
 def download_pdfs():
     try:
         month = request.args.get("month")
         year = request.args.get("year")
-        print(f"DEBUG: Searching S3 for year/month: {year}/{month}")
+        filename = f'payslips_{year}_{month}.zip' if year and month else f'payslips_{month}.zip' if month else 'payslips.zip'
+        if request.args.get("delivery", DOWNLOAD_DELIVERY) == "presigned":
+            # The archive is built off the request path; until it exists the
+            # client is told to come back
+            archive_key, ready = refresh_month_archive(month=month, year=year)
+            if archive_key is None:
+                return jsonify({"error": "No PDF files found"}), 404
+            if not ready:
+                response = jsonify({"message": "Archive is being prepared, try again shortly",
+                                    "retry_after": ARCHIVE_RETRY_AFTER})
+                response.headers["Retry-After"] = str(ARCHIVE_RETRY_AFTER)
+                return response, 202
+            expires = request.args.get("expires", type=int) or PRESIGNED_URL_EXPIRY
+            return redirect(presigned_url(archive_key, expires=expires, download_name=filename), code=302)
+
         s3_pdf_keys = list_s3_pdfs(month=month, year=year)
-        print(f"DEBUG: Found keys: {s3_pdf_keys}")
+        logger.debug("Found %d PDFs in S3 for %s/%s", len(s3_pdf_keys), year, month)
         
         if not s3_pdf_keys:
             return jsonify({"error": "No PDF files found"}), 404
@@ -565,13 +1180,77 @@ def download_pdfs():
                 zipf.writestr(os.path.basename(s3_key), pdf_data.read())
 
         zip_buffer.seek(0)
-        filename = f'payslips_{year}_{month}.zip' if year and month else f'payslips_{month}.zip' if month else 'payslips.zip'
         return send_file(zip_buffer, mimetype='application/zip', as_attachment=True, download_name=filename)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/payslips/<year>/<month>/<emp_id>", methods=["GET"])
+def get_payslip(year, month, emp_id):
+    """One employee's slip, found through the slip index (never a bucket listing).
+
+    Streams the PDF (hot slips come from an in-memory LRU), or redirects to a
+    presigned URL with delivery=presigned; download=1 makes it an attachment.
+    """
+    try:
+        entry = find_slip(year, month, emp_id)
+        if entry is None:
+            return jsonify({"error": "No payslip indexed for this employee and pay period"}), 404
+        filename = f"{entry['emp_id']}_{entry['month']}_{entry['year']}.pdf"
+        if request.args.get("delivery", DOWNLOAD_DELIVERY) == "presigned":
+            return redirect(presigned_url(entry["s3_key"], expires=request.args.get("expires", type=int),
+                                          download_name=filename), code=302)
+
+        cache_key = (entry["s3_key"], entry["updated_at"])
+        data = slip_cache.get(cache_key)
+        hit = data is not None
+        if not hit:
+            try:
+                data = read_s3_object(entry["s3_key"])
+            except Exception as e:
+                if getattr(e, "response", {}).get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                    return jsonify({"error": "Payslip is indexed but no longer in S3"}), 404
+                raise
+            slip_cache.put(cache_key, data)
+        response = send_file(io.BytesIO(data), mimetype="application/pdf", download_name=filename,
+                             as_attachment=is_truthy(request.args.get("download")))
+        response.headers["X-Cache"] = "hit" if hit else "miss"
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/payslips/cache", methods=["GET"])
+def payslip_cache_stats():
+    return jsonify(slip_cache.stats())
+
+@app.route("/reports/units", methods=["GET"])
+def report_units():
+    try:
+        year = request.args.get("year", str(datetime.now().year))
+        month = request.args.get("month")
+        return jsonify({"year": year, "month": month, "units": unit_totals(year, month)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/reports/ytd", methods=["GET"])
+def report_ytd():
+    try:
+        year = request.args.get("year", str(datetime.now().year))
+        upto = request.args.get("upto")
+        emp_id = request.args.get("emp_id")
+        return jsonify({"year": year, "upto": upto, "employees": ytd_by_employee(year, upto, emp_id)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/reports/statutory", methods=["GET"])
+def report_statutory():
+    try:
+        year = request.args.get("year", str(datetime.now().year))
+        month = request.args.get("month")
+        by_unit = request.args.get("by_unit", "").lower() in ("1", "true", "yes")
+        return jsonify({"year": year, "month": month, "summary": statutory_summary(year, month, by_unit)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == "__main__":
-    print("\n" + "="*80)
-    print("PAYSLIP GENERATOR STARTING")
-    print("="*80 + "\n")
+    logger.info("Payslip generator starting")
     app.run(debug=True)
@@ -0,0 +1,388 @@
+"""
+Load Test
+Replays concurrent /upload, /send-emails, /download and /download-current
+traffic against the real app under gunicorn and reports throughput,
+p50/p95/p99 latency and error rates per endpoint. Uses synthetic workbooks,
+an in-process S3 stand-in (moto) and a local SMTP sink, so nothing leaves
+the machine; all app data goes to a temporary directory.
+
+    pip install "moto[server]"
+    python load_test.py [--workers 1,2,4] [--concurrency 1,4,8] [--duration 30] [--rows 25]
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BUCKET = "loadtest-payslips"
+ENDPOINTS = ["upload", "send", "download", "download-current"]
+DEFAULT_MIX = "upload=2,send=1,download=2,download-current=1"
+REQUEST_TIMEOUT = 300
+
+COLUMNS = [
+    "EMP_ID", "Name", "Designation", "Unit_Name", "UAN_No", "ESI_No", "DOJ", "Bank_AC", "IFSC_Code", "Email",
+    "Phone", "Basic_Days", "Actual_Days", "Fixed_Basic", "Fixed_DA", "Fixed_HRA", "Fixed_Bonus", "Fixed_Total",
+    "Earned_Basic", "Earned_DA", "Earned_HRA", "Earned_Leave_Wages", "Other_Allowance", "Earned_Bonus",
+    "Earned_Total", "PF", "ESI", "PT", "LWF", "Total_Deduction", "Net_Pay",
+]
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Accepts any login and swallows every message; counts what it received"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.received = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.received += 1
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, text):
+        self.wfile.write(text.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 loadtest SMTP sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode(errors="replace").strip().upper()
+            if cmd.startswith("EHLO"):
+                self.reply("250-loadtest\r\n250-AUTH PLAIN LOGIN\r\n250 OK")
+            elif cmd.startswith("AUTH LOGIN"):
+                for prompt in ("334 VXNlcm5hbWU6", "334 UGFzc3dvcmQ6"):
+                    self.reply(prompt)
+                    self.rfile.readline()
+                self.reply("235 OK")
+            elif cmd.startswith("AUTH PLAIN"):
+                if len(cmd.split()) == 2:
+                    self.reply("334 ")
+                    self.rfile.readline()
+                self.reply("235 OK")
+            elif cmd == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.count()
+                self.reply("250 OK")
+            elif cmd == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_workbook(path, rows, seed):
+    """Synthetic payroll sheet; seed changes the amounts (and so the upload hash) but not the EMP_IDs"""
+    from openpyxl import Workbook
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(COLUMNS)
+    for i in range(rows):
+        basic, da, hra = rng.randint(9000, 20000), 3000, 1500
+        fixed_total = basic + da + hra
+        days = rng.randint(20, 31)
+        e_basic, e_da, e_hra = (round(v * days / 31) for v in (basic, da, hra))
+        earned_total = e_basic + e_da + e_hra
+        pf, esi, pt = round(e_basic * 0.12), round(earned_total * 0.0075), 200
+        deduction = pf + esi + pt
+        ws.append([f"LT{i:05d}", f"Load Test {i}", "Security Guard", f"Unit {i % 7}", f"1001{i:08d}",
+                   f"51{i:08d}", "01-04-2022", f"9{i:011d}", "SBIN0000001", f"emp{i}@loadtest.invalid", "",
+                   31, days, basic, da, hra, 0, fixed_total, e_basic, e_da, e_hra, 0, 0, 0, earned_total,
+                   pf, esi, pt, 0, deduction, earned_total - deduction])
+    wb.save(path)
+
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def http(method, url, body=None, content_type=None):
+    """Returns (status, body bytes); HTTP errors are returned, not raised"""
+    req = urllib.request.Request(url, data=body, method=method)
+    if content_type:
+        req.add_header("Content-Type", content_type)
+    try:
+        with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+class LoadTest:
+    """Shared state for one run: the server under test and everything the virtual users record"""
+
+    def __init__(self, base_url, work_dir, args):
+        self.base_url = base_url
+        self.work_dir = work_dir
+        self.args = args
+        self.samples = []
+        self.run_id = None
+        self._seed = 0
+        self._lock = threading.Lock()
+
+    def next_workbook(self):
+        with self._lock:
+            self._seed += 1
+            seed = self._seed
+        path = os.path.join(self.work_dir, f"workbook-{seed}.xlsx")
+        make_workbook(path, self.args.rows, seed)
+        with open(path, "rb") as f:
+            data = f.read()
+        os.remove(path)
+        return data
+
+    def prepare(self, endpoint):
+        """Build the request outside the timed section"""
+        month, year = self.args.month, self.args.year
+        if endpoint == "upload":
+            body, ctype = multipart({"month": month, "year": year},
+                                    {"csv_file": ("loadtest.xlsx", self.next_workbook())})
+            return "POST", "/upload", body, ctype
+        if endpoint == "send":
+            body = json.dumps({"run_id": self.run_id, "month": month}).encode()
+            return "POST", "/send-emails", body, "application/json"
+        if endpoint == "download":
+            return "GET", f"/download?month={month}&year={year}&delivery={self.args.download_delivery}", None, None
+        return "GET", f"/download-current?run_id={urllib.parse.quote(self.run_id or '')}", None, None
+
+    def call(self, endpoint):
+        method, path, body, ctype = self.prepare(endpoint)
+        start = time.perf_counter()
+        try:
+            status, data = http(method, self.base_url + path, body, ctype)
+        except Exception as e:
+            status, data = type(e).__name__, b""
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.samples.append((endpoint, elapsed, status))
+        if endpoint == "upload" and status == 200:
+            run_id = json.loads(data).get("run_id")
+            with self._lock:
+                self.run_id = run_id
+        return status
+
+    def user(self, deadline, mix, seed):
+        rng = random.Random(seed)
+        names, weights = zip(*mix.items())
+        while time.time() < deadline:
+            self.call(rng.choices(names, weights)[0])
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+
+def summarize(samples, duration):
+    report = {}
+    for endpoint in ENDPOINTS + ["all"]:
+        rows = [s for s in samples if endpoint in ("all", s[0])]
+        if not rows:
+            continue
+        latencies = [s[1] * 1000 for s in rows]
+        errors = [s for s in rows if not (isinstance(s[2], int) and s[2] < 400)]
+        statuses = {}
+        for s in rows:
+            statuses[str(s[2])] = statuses.get(str(s[2]), 0) + 1
+        report[endpoint] = {
+            "requests": len(rows), "errors": len(errors),
+            "error_pct": round(100 * len(errors) / len(rows), 1),
+            "rps": round(len(rows) / duration, 2),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "statuses": statuses,
+        }
+    return report
+
+
+def start_app(workers, threads, env, log_path):
+    port = free_port()
+    log = open(log_path, "ab")
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-w", str(workers), "--threads", str(threads),
+                             "-b", f"127.0.0.1:{port}", "--timeout", str(REQUEST_TIMEOUT), "app:app"],
+                            cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}; see {log_path}")
+        try:
+            if http("GET", base_url + "/")[0] == 200:
+                return proc, base_url
+        except OSError:
+            pass
+        time.sleep(0.3)
+    proc.terminate()
+    raise RuntimeError(f"gunicorn did not come up within 60s; see {log_path}")
+
+
+def app_env(work_dir, s3_endpoint, smtp_port, args):
+    env = dict(os.environ)
+    env.pop("AWS_SESSION_TOKEN", None)
+    env.update({
+        "AWS_ACCESS_KEY_ID": "loadtest", "AWS_SECRET_ACCESS_KEY": "loadtest", "AWS_REGION": "us-east-1",
+        "S3_BUCKET": BUCKET, "S3_ENDPOINT_URL": s3_endpoint,
+        "SMTP_SERVER": "127.0.0.1", "SMTP_PORT": str(smtp_port), "SMTP_STARTTLS": "false",
+        "SENDER_EMAIL": "payroll@loadtest.invalid", "EMAIL_PASSWORD": "loadtest",
+        "EMAIL_DELIVERY": args.email_delivery, "RENDER_MODE": "local", "LOG_LEVEL": "WARNING",
+        "UPLOAD_DIR": os.path.join(work_dir, "uploads"), "OUTPUT_DIR": os.path.join(work_dir, "payslips"),
+        "PARSED_CACHE_DIR": os.path.join(work_dir, "parsed_cache"),
+        "PAYROLL_HISTORY_DIR": os.path.join(work_dir, "history"),
+        "RUN_CHECKPOINT_DB": os.path.join(work_dir, "runs.db"),
+        "RENDER_QUEUE_DB": os.path.join(work_dir, "render_queue.db"),
+        "SLIP_INDEX_DB": os.path.join(work_dir, "slip_index.db"),
+        "LOGO_CACHE_DIR": os.path.join(work_dir, "asset_cache"),
+        "SCRATCH_HTML_DIR": os.path.join(work_dir, "html"),
+        "PROFILE_DIR": os.path.join(work_dir, "profiles"), "LOG_DIR": os.path.join(work_dir, "logs"),
+    })
+    if args.wkhtmltopdf:
+        env["WKHTMLTOPDF_CMD"] = args.wkhtmltopdf
+    return env
+
+
+def run_level(base_url, work_dir, args, concurrency, mix):
+    test = LoadTest(base_url, work_dir, args)
+    # One upload first so downloads and sends have something to work on
+    status = test.call("upload")
+    if status != 200:
+        raise RuntimeError(f"Priming upload failed with {status}")
+    test.samples.clear()
+
+    deadline = time.time() + args.duration
+    users = [threading.Thread(target=test.user, args=(deadline, mix, n), daemon=True) for n in range(concurrency)]
+    start = time.time()
+    for u in users:
+        u.start()
+    for u in users:
+        u.join()
+    return summarize(test.samples, time.time() - start)
+
+
+def print_report(workers, threads, concurrency, report, emails):
+    print(f"\nworkers={workers} threads={threads} concurrency={concurrency}  (emails received so far: {emails})")
+    print(f"  {'endpoint':<18}{'reqs':>7}{'err%':>7}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+    for endpoint, r in report.items():
+        print(f"  {endpoint:<18}{r['requests']:>7}{r['error_pct']:>7}{r['rps']:>8}{r['p50_ms']:>10}"
+              f"{r['p95_ms']:>10}{r['p99_ms']:>10}  {r['statuses']}")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint in --mix: {name} (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the payslip app")
+    parser.add_argument("--workers", default="1", help="comma-separated gunicorn worker counts to sweep (Dockerfile: 1)")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker (Dockerfile: 8)")
+    parser.add_argument("--concurrency", default="1,4,8", help="comma-separated virtual user counts to sweep")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per concurrency level")
+    parser.add_argument("--rows", type=int, default=25, help="employees per synthetic workbook")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint weights, e.g. upload=1,download=3")
+    parser.add_argument("--month", default="Jan")
+    parser.add_argument("--year", default="2099", help="pay period used by the test (kept away from real data)")
+    parser.add_argument("--download-delivery", choices=["stream", "presigned"], default="stream")
+    parser.add_argument("--email-delivery", choices=["attachment", "link"], default="attachment")
+    parser.add_argument("--wkhtmltopdf", help="wkhtmltopdf binary for the app (default: auto-detect)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        print('The S3 stand-in needs moto: pip install "moto[server]"')
+        return 2
+    import boto3
+
+    mix = parse_mix(args.mix)
+    workers_levels = [int(w) for w in args.workers.split(",")]
+    concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+
+    # moto serves through werkzeug, which logs every request
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    s3_port = free_port()
+    s3 = ThreadedMotoServer(ip_address="127.0.0.1", port=s3_port, verbose=False)
+    s3.start()
+    s3_endpoint = f"http://127.0.0.1:{s3_port}"
+    boto3.client("s3", region_name="us-east-1", endpoint_url=s3_endpoint, aws_access_key_id="loadtest",
+                 aws_secret_access_key="loadtest").create_bucket(Bucket=BUCKET)
+    smtp = SMTPSink()
+    threading.Thread(target=smtp.serve_forever, daemon=True).start()
+
+    print("=" * 60)
+    print("  LOAD TEST")
+    print("=" * 60)
+    print(f"Mix: {mix}  duration: {args.duration}s per level  rows/workbook: {args.rows}")
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="loadtest_") as work_dir:
+            env = app_env(work_dir, s3_endpoint, smtp.server_address[1], args)
+            for workers in workers_levels:
+                proc, base_url = start_app(workers, args.threads, env, os.path.join(work_dir, "gunicorn.log"))
+                try:
+                    for concurrency in concurrency_levels:
+                        report = run_level(base_url, work_dir, args, concurrency, mix)
+                        print_report(workers, args.threads, concurrency, report, smtp.received)
+                        results.append({"workers": workers, "threads": args.threads,
+                                        "concurrency": concurrency, "endpoints": report})
+                finally:
+                    proc.terminate()
+                    proc.wait(timeout=30)
+    finally:
+        smtp.shutdown()
+        s3.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Logging Benchmark
+Measures the per-row cost of the generation loop's log output: the old
+print() lines, the logging calls at the default INFO level (debug lines
+disabled), and with LOG_LEVEL=DEBUG through the queue handler.
+
+    python log_benchmark.py [--rows 20000]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+
+def per_row_us(fn, rows):
+    start = time.perf_counter()
+    for i in range(rows):
+        fn(i)
+    return (time.perf_counter() - start) * 1e6 / rows
+
+
+def legacy_prints(i):
+    # What row_to_payslip() and the store stage printed for every employee
+    print(f"Row {i + 1}: EMP_ID=E{i:05d}, Name=Employee {i}")
+    print(f"Processing employee E{i:05d}...")
+    print("DEBUG: Storing to S3 with year/month folder: 2026/Jan")
+    print(f"DEBUG: S3 key created: 2026/Jan/E{i:05d}.pdf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-row logging overhead")
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="logbench_") as log_dir:
+        os.environ["LOG_DIR"] = log_dir
+        os.environ["LOG_CONSOLE_FORMAT"] = "json"
+        import log_config
+
+        real_stdout = sys.stdout
+        with open(os.path.join(log_dir, "stdout.txt"), "w") as sink:
+            sys.stdout = sink
+            try:
+                legacy = per_row_us(legacy_prints, args.rows)
+
+                log_config.setup_logging("logbench")
+                logger = logging.getLogger("app")
+
+                def logged(i):
+                    logger.debug("Row %d: EMP_ID=%s, Name=%s", i + 1, f"E{i:05d}", f"Employee {i}")
+                    logger.debug("Stored %s as %s", f"E{i:05d}", f"2026/Jan/E{i:05d}.pdf")
+
+                with log_config.run_context("bench"):
+                    logging.getLogger().setLevel(logging.INFO)
+                    disabled = per_row_us(logged, args.rows)
+                    logging.getLogger().setLevel(logging.DEBUG)
+                    start = time.perf_counter()
+                    enabled = per_row_us(logged, args.rows)
+                    log_config.shutdown_logging()
+                    drained = (time.perf_counter() - start) * 1e6 / args.rows
+            finally:
+                sys.stdout = real_stdout
+
+    print("=" * 60)
+    print("  LOGGING BENCHMARK")
+    print("=" * 60)
+    print(f"Rows:                          {args.rows}")
+    print(f"print() per row (old):         {legacy:8.2f} us")
+    print(f"logging, INFO (default):       {disabled:8.2f} us")
+    print(f"logging, DEBUG, caller side:   {enabled:8.2f} us")
+    print(f"logging, DEBUG, incl. writing: {drained:8.2f} us (listener thread)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import os
+import re
+import sys
+import json
+import time
+import socket
+import atexit
+import logging
+import logging.handlers
+import queue
+import contextvars
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_DIR = os.getenv("LOG_DIR", os.path.join(BASE_DIR, "logs"))
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# Log files of exited processes are removed once untouched this long
+LOG_MAX_AGE_DAYS = float(os.getenv("LOG_MAX_AGE_DAYS", "14"))
+# "text" for people reading docker logs, "json" to ship stdout to a collector;
+# the rotated files are always JSON lines
+LOG_CONSOLE_FORMAT = os.getenv("LOG_CONSOLE_FORMAT", "text")
+
+# Correlation id of the run the current thread is working on
+run_id_var = contextvars.ContextVar("run_id", default="-")
+
+# Attributes every LogRecord has; anything else came in through extra={...}
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "run_id"}
+
+_listener = None
+
+
+@contextmanager
+def run_context(run_id):
+    """Tag every log line emitted inside the block (and by pipelines it starts) with run_id"""
+    token = run_id_var.set(run_id)
+    try:
+        yield
+    finally:
+        run_id_var.reset(token)
+
+
+class RunIdFilter(logging.Filter):
+    """Stamps the caller's run id on the record before it crosses the queue"""
+
+    def filter(self, record):
+        record.run_id = run_id_var.get()
+        return True
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() copies and fully formats each record so it can be
+    pickled to another process; in-process only the message needs pinning
+    down now, in case its arguments are mutated after the call.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "run_id": getattr(record, "run_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _log_file_name(role):
+    # One file per process: RotatingFileHandler can't safely share a file
+    # between gunicorn workers or worker replicas
+    return os.path.join(LOG_DIR, f"{role}-{socket.gethostname()}-{os.getpid()}.log")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _prune_logs(role):
+    """Remove this role's log files (and their backups) untouched for LOG_MAX_AGE_DAYS.
+
+    Files of live processes on this host are kept however old; pids from
+    other hosts sharing LOG_DIR (or older files named without a host) can't
+    be checked, so age alone decides.
+    """
+    pattern = re.compile(rf"^{re.escape(role)}-(?:(.+)-)?(\d+)\.log(\.\d+)?$")
+    host = socket.gethostname()
+    cutoff = time.time() - LOG_MAX_AGE_DAYS * 86400
+    for entry in os.scandir(LOG_DIR):
+        match = pattern.match(entry.name)
+        if not match or (match.group(1) == host and _pid_alive(int(match.group(2)))):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def setup_logging(role="app"):
+    """Route all logging through a queue to console and rotated files; safe to call twice.
+
+    Callers only pay for putting a record on an in-memory queue; formatting
+    and I/O happen on the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    console = logging.StreamHandler(sys.stdout)
+    if LOG_CONSOLE_FORMAT == "json":
+        console.setFormatter(JsonFormatter())
+    else:
+        console.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s [%(run_id)s] %(name)s: %(message)s"))
+    handlers = [console]
+
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        _prune_logs(role)
+        file_handler = logging.handlers.RotatingFileHandler(
+            _log_file_name(role), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    except OSError as e:
+        sys.stderr.write(f"File logging disabled, cannot write to {LOG_DIR}: {e}\n")
+
+    queue_handler = _InProcessQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(RunIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(queue_handler)
+    # Third-party libraries are chatty at DEBUG
+    for noisy in ("botocore", "boto3", "s3transfer", "urllib3", "PIL"):
+        logging.getLogger(noisy).setLevel(max(logging.INFO, root.level))
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,199 @@
+import os
+import tempfile
+from datetime import datetime
+
+from run_checkpoints import safe_run_id
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_DIR = os.getenv("PAYROLL_HISTORY_DIR", os.path.join(BASE_DIR, "history"))
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+
+AMOUNT_COLUMNS = [
+    "fixed_basic", "fixed_da", "fixed_hra", "fixed_bonus", "fixed_total",
+    "earned_basic", "earned_da", "earned_hra", "earned_leave_wages", "other_allowance",
+    "earned_bonus", "earned_total",
+    "pf", "esi", "pt", "lwf", "total_deduction", "net_pay",
+]
+
+STRING_COLUMNS = ["emp_id", "name", "designation", "unit_name", "month"]
+
+
+def _schema():
+    # pyarrow is imported on first use to keep app startup light
+    import pyarrow as pa
+    return pa.schema(
+        [(c, pa.string()) for c in STRING_COLUMNS]
+        + [(c, pa.float64()) for c in AMOUNT_COLUMNS]
+        + [("run_id", pa.string()), ("generated_at", pa.timestamp("us"))]
+    )
+
+
+def month_number(month):
+    """Map a month name (full or 3-letter, any case) or number to 1-12, or 0 if unknown"""
+    m = str(month).strip()
+    if m.isdigit() and 1 <= int(m) <= 12:
+        return int(m)
+    for i, name in enumerate(MONTHS, 1):
+        if m.lower() in (name.lower(), name[:3].lower()):
+            return i
+    return 0
+
+
+def make_record(slip):
+    """Flatten one payslip render context (see app.row_to_payslip) into a history record"""
+    emp_data = slip["emp"]
+    salary_fixed = slip["salary_fixed"]
+    salary_earned = slip["salary_earned"]
+    deduction = slip["deduction"]
+    return {
+        "emp_id": emp_data["emp_id"],
+        "name": emp_data["name"],
+        "designation": emp_data["designation"],
+        "unit_name": emp_data["unit_name"],
+        "fixed_basic": salary_fixed["basic"],
+        "fixed_da": salary_fixed["da"],
+        "fixed_hra": salary_fixed["hra"],
+        "fixed_bonus": salary_fixed["bonus"],
+        "fixed_total": salary_fixed["total"],
+        "earned_basic": salary_earned["basic"],
+        "earned_da": salary_earned["da"],
+        "earned_hra": salary_earned["hra"],
+        "earned_leave_wages": salary_earned["leave_wages"],
+        "other_allowance": salary_earned["others"],
+        "earned_bonus": salary_earned["bonus"],
+        "earned_total": salary_earned["total"],
+        "pf": deduction["pf"],
+        "esi": deduction["esi"],
+        "pt": deduction["pt"],
+        "lwf": deduction["lwf"],
+        "total_deduction": deduction["total"],
+        "net_pay": slip["net_pay"],
+    }
+
+
+def append_run(records, year, month, run_id):
+    """Append one generation run's records to the year/month partitioned store.
+
+    Each run writes its own file, so a re-upload of the same workbook replaces
+    that file while different unit sheets for the same month sit side by side.
+    """
+    if not records:
+        return None
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    try:
+        year_num = int(year)
+    except (TypeError, ValueError):
+        year_num = datetime.now().year
+    month_num = month_number(month)
+
+    generated_at = datetime.now()
+    rows = [dict(r, month=str(month), run_id=run_id, generated_at=generated_at) for r in records]
+    table = pa.Table.from_pylist(rows, schema=_schema())
+
+    part_dir = os.path.join(HISTORY_DIR, f"year={year_num}", f"month_num={month_num}")
+    os.makedirs(part_dir, exist_ok=True)
+    path = os.path.join(part_dir, f"{safe_run_id(run_id)}.parquet")
+    # Unique per call, as threads of one process may append the same run at once;
+    # the leading dot keeps load_history's dataset scan from reading it half-written
+    fd, tmp_path = tempfile.mkstemp(dir=part_dir, prefix=f".{os.path.basename(path)}.", suffix=".part")
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def load_history(year=None, month=None, columns=None):
+    """Load history rows, pruning partitions by year/month.
+
+    When the same employee appears in several runs for one month, only the
+    latest record is kept.
+    """
+    import pandas as pd
+    import pyarrow.dataset as ds
+    if not os.path.isdir(HISTORY_DIR):
+        return pd.DataFrame(columns=_schema().names + ["year", "month_num"])
+
+    dataset = ds.dataset(HISTORY_DIR, format="parquet", partitioning="hive",
+                         exclude_invalid_files=True)
+    flt = None
+    if year:
+        flt = ds.field("year") == int(year)
+    if month:
+        cond = ds.field("month_num") == month_number(month)
+        flt = cond if flt is None else flt & cond
+
+    if columns is not None:
+        columns = list(dict.fromkeys(list(columns) + ["emp_id", "year", "month_num", "generated_at"]))
+    df = dataset.to_table(filter=flt, columns=columns).to_pandas()
+    if df.empty:
+        return df
+
+    df = df.sort_values("generated_at").drop_duplicates(["year", "month_num", "emp_id"], keep="last")
+    return df.reset_index(drop=True)
+
+
+def unit_totals(year, month=None):
+    """Headcount and salary totals per unit for a year or a single month"""
+    cols = ["unit_name", "fixed_total", "earned_total", "total_deduction", "net_pay"]
+    df = load_history(year, month, columns=cols)
+    if df.empty:
+        return []
+    out = df.groupby("unit_name", sort=True).agg(
+        employees=("emp_id", "nunique"),
+        fixed_total=("fixed_total", "sum"),
+        earned_total=("earned_total", "sum"),
+        total_deduction=("total_deduction", "sum"),
+        net_pay=("net_pay", "sum"),
+    )
+    return out.round(2).reset_index().to_dict(orient="records")
+
+
+def ytd_by_employee(year, upto_month=None, emp_id=None):
+    """Year-to-date earned, deduction and net totals per employee"""
+    cols = ["name", "unit_name", "earned_total", "pf", "esi", "pt", "total_deduction", "net_pay"]
+    df = load_history(year, columns=cols)
+    if df.empty:
+        return []
+    if upto_month:
+        df = df[df["month_num"] <= month_number(upto_month)]
+    if emp_id:
+        df = df[df["emp_id"] == str(emp_id)]
+    df = df.sort_values(["year", "month_num"])
+    out = df.groupby("emp_id", sort=True).agg(
+        name=("name", "last"),
+        unit_name=("unit_name", "last"),
+        months=("month_num", "nunique"),
+        earned_total=("earned_total", "sum"),
+        pf=("pf", "sum"),
+        esi=("esi", "sum"),
+        pt=("pt", "sum"),
+        total_deduction=("total_deduction", "sum"),
+        net_pay=("net_pay", "sum"),
+    )
+    return out.round(2).reset_index().to_dict(orient="records")
+
+
+def statutory_summary(year, month=None, by_unit=False):
+    """PF/ESI/PT/LWF totals per month, optionally split by unit"""
+    cols = ["unit_name", "pf", "esi", "pt", "lwf"]
+    df = load_history(year, month, columns=cols)
+    if df.empty:
+        return []
+    keys = ["month_num", "unit_name"] if by_unit else ["month_num"]
+    out = df.groupby(keys, sort=True).agg(
+        employees=("emp_id", "nunique"),
+        pf=("pf", "sum"),
+        esi=("esi", "sum"),
+        pt=("pt", "sum"),
+        lwf=("lwf", "sum"),
+    ).round(2).reset_index()
+    out.insert(1, "month", out["month_num"].map(lambda m: MONTHS[m - 1] if 1 <= m <= 12 else ""))
+    return out.to_dict(orient="records")
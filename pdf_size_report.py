@@ -0,0 +1,90 @@
+"""
+PDF Size Report
+Renders a sample payslip with the legacy renderer settings (full-resolution
+logo, wkhtmltopdf defaults) and with the optimized settings (downsampled logo,
+tuned image DPI/quality, optional pikepdf pass) and prints the byte sizes.
+
+    python pdf_size_report.py [--count 5]
+"""
+
+import argparse
+import base64
+import os
+import subprocess
+import sys
+import tempfile
+
+import renderer
+from render_supervisor import RENDER_TIMEOUT
+
+SAMPLE_SLIP = {
+    "emp": {"emp_id": "SAMPLE001", "name": "Sample Employee", "designation": "Security Guard",
+            "unit_name": "Sample Unit", "uan": "100200300400", "esi": "5100200300", "doj": "01-04-2022",
+            "bank_ac": "123456789012", "ifsc": "SBIN0000001", "email": "", "phone": "",
+            "basic_days": "31", "actual_days": "30"},
+    "salary_fixed": {"basic": 12000.0, "da": 3000.0, "hra": 1500.0, "leave_wages": 0, "others": 0,
+                     "bonus": 800.0, "total": 17300.0},
+    "salary_earned": {"basic": 11613.0, "da": 2903.0, "hra": 1452.0, "leave_wages": 0.0, "others": 0.0,
+                      "bonus": 774.0, "total": 16742.0},
+    "deduction": {"pf": 1742.0, "esi": 126.0, "pt": 200.0, "lwf": 0.0, "adv": 0, "total": 2068.0},
+    "net_pay": 14674.0,
+    "net_pay_words": "Fourteen Thousand Six Hundred Seventy Four rupees only",
+}
+
+
+def render_legacy(slip, work_dir):
+    """Render the way the app did before size tuning: original logo, default wkhtmltopdf image settings"""
+    renderer.get_template()
+    optimized = (renderer._logo_base64, renderer._logo_mime)
+    renderer._logo_base64, renderer._logo_mime = renderer.get_logo_base64(), "image/png"
+    try:
+        html = renderer.render_html(slip, "January")
+    finally:
+        renderer._logo_base64, renderer._logo_mime = optimized
+
+    html_path = os.path.join(work_dir, "legacy.html")
+    pdf_path = os.path.join(work_dir, "legacy.pdf")
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write(html)
+    subprocess.run([renderer.get_wkhtmltopdf_cmd(), "--enable-local-file-access", "--page-size", "A4",
+        "--margin-top", "10mm", "--margin-bottom", "10mm", "--margin-left", "10mm",
+        "--margin-right", "10mm", html_path, pdf_path], capture_output=True, check=True,
+        timeout=RENDER_TIMEOUT)
+    return os.path.getsize(pdf_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare payslip PDF sizes before/after optimization")
+    parser.add_argument("--count", type=int, default=5, help="slips to render per variant")
+    args = parser.parse_args()
+
+    original_logo = len(base64.b64decode(renderer.get_logo_base64() or ""))
+    renderer.get_template()
+    optimized_logo = len(base64.b64decode(renderer._logo_base64 or ""))
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="pdfsize_") as work_dir:
+        for i in range(args.count):
+            slip = dict(SAMPLE_SLIP, emp=dict(SAMPLE_SLIP["emp"], emp_id=f"SAMPLE{i:03d}"))
+            legacy = render_legacy(slip, work_dir)
+            pdf_path = renderer.render_payslip(slip, "January", work_dir)
+            tuned = os.path.getsize(pdf_path)
+            _, final = renderer.optimize_pdf(pdf_path)
+            rows.append((slip["emp"]["emp_id"], legacy, tuned, final))
+
+    print("=" * 60)
+    print("  PDF SIZE REPORT")
+    print("=" * 60)
+    print(f"Logo:  {original_logo:>9,} bytes -> {optimized_logo:>9,} bytes")
+    print(f"\n{'EMP_ID':<12}{'legacy':>12}{'tuned':>12}{'+pikepdf':>12}")
+    for emp_id, legacy, tuned, final in rows:
+        print(f"{emp_id:<12}{legacy:>12,}{tuned:>12,}{final:>12,}")
+    legacy_avg = sum(r[1] for r in rows) / len(rows)
+    final_avg = sum(r[3] for r in rows) / len(rows)
+    print(f"\nAverage: {legacy_avg:,.0f} -> {final_avg:,.0f} bytes per slip "
+          f"({100 * (legacy_avg - final_avg) / legacy_avg:.1f}% smaller)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
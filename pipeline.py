@@ -0,0 +1,214 @@
+import threading
+import queue
+import time
+import logging
+import traceback
+import contextvars
+
+from profiling import profile_thread
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+# Pipelines currently running in this process, for /pipeline/stats
+_active = {}
+_active_lock = threading.Lock()
+
+
+class Stage:
+    """One pipeline step run by `workers` threads.
+
+    func(item) returns the item to pass downstream, or None to drop it
+    (e.g. an empty row). Exceptions are recorded against the item and the
+    item is dropped; the rest of the run carries on.
+    """
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.busy = 0
+        self.busy_seconds = 0.0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+        self._running = 0
+
+
+class Pipeline:
+    """Runs items through stages connected by bounded queues.
+
+    A full queue blocks the stage feeding it, so a slow resource (S3, SMTP,
+    wkhtmltopdf) throttles everything upstream instead of letting rendered
+    work pile up in memory. At most queue_size items wait between any two
+    stages.
+    """
+
+    def __init__(self, name, stages, queue_size=16):
+        self.name = name
+        self.stages = stages
+        self.queue_size = max(1, int(queue_size))
+        self.queues = [queue.Queue(maxsize=self.queue_size) for _ in stages]
+        self.results = []
+        self.errors = []
+        self.ingested = 0
+        self.started_at = None
+        self.finished_at = None
+        self._aborted = threading.Event()
+        self.abort_reason = None
+        self._lock = threading.Lock()
+
+    def abort(self, reason):
+        """Stop feeding and processing new items; in-flight items finish"""
+        if not self._aborted.is_set():
+            self.abort_reason = reason
+            self._aborted.set()
+            logger.warning("Pipeline %s aborted: %s", self.name, reason)
+
+    @property
+    def aborted(self):
+        return self._aborted.is_set()
+
+    def _put(self, idx, item):
+        q = self.queues[idx]
+        q.put(item)
+        stage = self.stages[idx]
+        depth = q.qsize()
+        if depth > stage.max_depth:
+            stage.max_depth = depth
+
+    def _run_worker(self, idx):
+        stopped = False
+        try:
+            with profile_thread():
+                stopped = self._worker(idx)
+        except BaseException as e:
+            # Stage errors are caught per item; this is the worker itself breaking
+            logger.error("Pipeline %s: %s worker failed: %s", self.name, self.stages[idx].name, e,
+                         extra={"traceback": traceback.format_exc()})
+            self.abort(f"{self.stages[idx].name} worker failed: {e}")
+            if not stopped:
+                # Aborted, so this only drains the queue and keeps upstream stages from blocking on it
+                self._worker(idx)
+        finally:
+            self._finish(idx)
+
+    def _worker(self, idx):
+        """Process items until the stop marker; returns True once it has been taken"""
+        stage = self.stages[idx]
+        q = self.queues[idx]
+        last = idx == len(self.stages) - 1
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return True
+            if self.aborted:
+                continue
+            with stage._lock:
+                stage.busy += 1
+            start = time.perf_counter()
+            try:
+                out = stage.func(item)
+            except BaseException as e:
+                # Also catch SystemExit & co: a dead worker thread would leave the
+                # stages around it blocked on their queues forever
+                out = None
+                with stage._lock:
+                    stage.failed += 1
+                with self._lock:
+                    self.errors.append({"stage": stage.name, "item": item, "error": str(e),
+                                        "traceback": traceback.format_exc()})
+            else:
+                with stage._lock:
+                    if out is None:
+                        stage.dropped += 1
+                    else:
+                        stage.processed += 1
+            finally:
+                with stage._lock:
+                    stage.busy -= 1
+                    stage.busy_seconds += time.perf_counter() - start
+
+            if out is not None:
+                if last:
+                    with self._lock:
+                        self.results.append(out)
+                else:
+                    self._put(idx + 1, out)
+
+    def _finish(self, idx):
+        # The last worker of a stage to exit shuts down the next stage
+        stage = self.stages[idx]
+        last = idx == len(self.stages) - 1
+        with stage._lock:
+            stage._running -= 1
+            done = stage._running == 0
+        if done and not last:
+            for _ in range(self.stages[idx + 1].workers):
+                self.queues[idx + 1].put(_STOP)
+
+    def run(self, items):
+        """Feed items through every stage and block until the pipeline drains"""
+        self.started_at = time.time()
+        with _active_lock:
+            _active[self.name] = self
+
+        threads = []
+        for idx, stage in enumerate(self.stages):
+            stage._running = stage.workers
+            for n in range(stage.workers):
+                # Each worker runs in a copy of the caller's context so log
+                # lines keep the caller's run id
+                t = threading.Thread(target=contextvars.copy_context().run, args=(self._run_worker, idx),
+                                     name=f"{self.name}-{stage.name}-{n}", daemon=True)
+                t.start()
+                threads.append(t)
+
+        try:
+            for item in items:
+                if self.aborted:
+                    break
+                self._put(0, item)
+                self.ingested += 1
+        finally:
+            for _ in range(self.stages[0].workers):
+                self.queues[0].put(_STOP)
+            for t in threads:
+                t.join()
+            self.finished_at = time.time()
+            with _active_lock:
+                _active.pop(self.name, None)
+        return self.results
+
+    def stats(self):
+        """Per-stage queue depth, in-flight count and throughput counters"""
+        elapsed = (self.finished_at or time.time()) - (self.started_at or time.time())
+        return {
+            "name": self.name,
+            "running": self.finished_at is None,
+            "aborted": self.abort_reason,
+            "elapsed_s": round(elapsed, 3),
+            "ingested": self.ingested,
+            "queue_size": self.queue_size,
+            "stages": [{
+                "stage": s.name,
+                "workers": s.workers,
+                "queue_depth": q.qsize(),
+                "max_queue_depth": s.max_depth,
+                "in_flight": s.busy,
+                "processed": s.processed,
+                "dropped": s.dropped,
+                "failed": s.failed,
+                # Near 1.0 means this stage is the bottleneck
+                "utilization": round(s.busy_seconds / (elapsed * s.workers), 3) if elapsed > 0 else 0.0,
+            } for s, q in zip(self.stages, self.queues)],
+        }
+
+
+def active_stats():
+    with _active_lock:
+        pipelines = list(_active.values())
+    return [p.stats() for p in pipelines]
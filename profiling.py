@@ -0,0 +1,141 @@
+import os
+import io
+import json
+import time
+import cProfile
+import pstats
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from run_checkpoints import safe_run_id
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "tmp", "profiles"))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "25"))
+
+logger = logging.getLogger(__name__)
+
+# The session profiling the current request; pipeline worker threads see it
+# because they run in a copy of the request's context
+_session = contextvars.ContextVar("profile_session", default=None)
+
+# Pipeline threads blocked on their queues; that is idle time, not hot code
+_IDLE_FUNCTIONS = {"<method 'acquire' of '_thread.lock' objects>", "<method 'acquire' of '_thread.RLock' objects>"}
+
+
+def _run_dir(run_id):
+    return os.path.join(PROFILE_DIR, safe_run_id(run_id))
+
+
+class ProfileSession:
+    """cProfile data for one job, merged across the threads that worked on it"""
+
+    def __init__(self, job):
+        self.job = job
+        self.started_at = time.time()
+        self.elapsed_s = None
+        self._stats = None
+        self._lock = threading.Lock()
+
+    def add(self, profiler):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    def top(self, n=PROFILE_TOP_N):
+        """The n functions with the most own time, as plain dicts"""
+        if self._stats is None:
+            return []
+        rows = []
+        for (filename, line, name), (cc, nc, tt, ct, _) in self._stats.stats.items():
+            if name in _IDLE_FUNCTIONS:
+                continue
+            rows.append({"function": f"{os.path.basename(filename)}:{line}({name})", "calls": nc,
+                         "own_s": round(tt, 4), "cumulative_s": round(ct, 4)})
+        rows.sort(key=lambda r: r["own_s"], reverse=True)
+        return rows[:n]
+
+    def save(self, run_id):
+        """Write <job>-<timestamp>.prof (pstats format) and a JSON summary under PROFILE_DIR/<run_id>/"""
+        run_dir = _run_dir(run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        name = f"{self.job}-{time.strftime('%Y%m%d%H%M%S', time.localtime(self.started_at))}"
+        summary = {"run_id": run_id, "job": self.job, "profile": f"{name}.prof", "elapsed_s": self.elapsed_s,
+                   "top": self.top()}
+        if self._stats is not None:
+            self._stats.dump_stats(os.path.join(run_dir, f"{name}.prof"))
+            text = io.StringIO()
+            pstats.Stats(os.path.join(run_dir, f"{name}.prof"), stream=text).sort_stats("tottime").print_stats(50)
+            with open(os.path.join(run_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+                f.write(text.getvalue())
+        with open(os.path.join(run_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        logger.info("Saved %s profile for run %s to %s", self.job, run_id, run_dir)
+        return summary
+
+
+def _enable():
+    """A running profiler, or None when another one already owns the interpreter.
+
+    From Python 3.12 cProfile sits on sys.monitoring, which allows one
+    profiler per interpreter; that profiler then sees every thread.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+@contextmanager
+def profile_job(job):
+    """Profile the calling thread, and any pipeline it starts, for the duration of the block"""
+    session = ProfileSession(job)
+    token = _session.set(session)
+    start = time.perf_counter()
+    profiler = _enable()
+    if profiler is None:
+        logger.warning("Not profiling %s: another profiled job is running", job)
+    try:
+        yield session
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            session.add(profiler)
+        session.elapsed_s = round(time.perf_counter() - start, 3)
+        _session.reset(token)
+
+
+@contextmanager
+def profile_thread():
+    """Join the active profile session from a worker thread; a no-op when nothing is being profiled"""
+    session = _session.get()
+    profiler = _enable() if session is not None else None
+    if profiler is None:
+        # Nothing to join, or (Python 3.12+) the job's profiler already covers this thread
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        session.add(profiler)
+
+
+def list_profiles(run_id):
+    run_dir = _run_dir(run_id)
+    if not os.path.isdir(run_dir):
+        return []
+    return sorted(f for f in os.listdir(run_dir) if f.endswith((".prof", ".txt", ".json")))
+
+
+def profile_path(run_id, name):
+    """Path of a saved profile file, or None if it does not exist"""
+    if name not in list_profiles(run_id):
+        return None
+    return os.path.join(_run_dir(run_id), name)
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import sqlite3
+import importlib
+
+from scheduler import MAX_RENDERERS_PER_JOB
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+QUEUE_DB = os.getenv("RENDER_QUEUE_DB", os.path.join(BASE_DIR, "tmp", "render_queue.db"))
+QUEUE_BACKEND = os.getenv("RENDER_QUEUE_BACKEND", "sqlite")
+LEASE_SECONDS = int(os.getenv("RENDER_LEASE_SECONDS", "120"))
+MAX_ATTEMPTS = int(os.getenv("RENDER_MAX_ATTEMPTS", "3"))
+
+
+class RenderQueue:
+    """Interface for render task queues shared between the web app and render workers.
+
+    A task is a JSON payload (a chunk of payslips for one run). Workers claim
+    tasks under a time-limited lease and must heartbeat to keep it; tasks whose
+    lease expires are handed to the next worker that asks.
+    """
+
+    def enqueue(self, run_id, payloads, submitter=None, priority=0):
+        raise NotImplementedError
+
+    def claim(self, worker_id, limit=1, lease_seconds=LEASE_SECONDS, per_run_cap=MAX_RENDERERS_PER_JOB,
+              max_attempts=MAX_ATTEMPTS):
+        """Return a list of (task_id, payload) now leased to worker_id, fairly across submitters.
+
+        A task whose lease expired after max_attempts claims is marked failed
+        instead of being handed out again.
+        """
+        raise NotImplementedError
+
+    def heartbeat(self, worker_id, task_ids, lease_seconds=LEASE_SECONDS):
+        raise NotImplementedError
+
+    def complete(self, task_id, worker_id, result):
+        raise NotImplementedError
+
+    def fail(self, task_id, worker_id, error, max_attempts=MAX_ATTEMPTS):
+        raise NotImplementedError
+
+    def run_status(self, run_id):
+        raise NotImplementedError
+
+    def queue_position(self, run_id):
+        """Optional: where the run's next pending task stands in the queue"""
+        return None
+
+
+class SQLiteRenderQueue(RenderQueue):
+    """Queue stored in a SQLite file on a volume shared by all replicas on one host"""
+
+    def __init__(self, path=QUEUE_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    submitter TEXT,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    started_at REAL
+                )""")
+            # Queue files created before fair scheduling lack the newer columns
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+            for column, ddl in (("submitter", "TEXT"), ("priority", "INTEGER NOT NULL DEFAULT 0"),
+                                ("started_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {ddl}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, lease_expires)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_run ON tasks(run_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_submitter ON tasks(submitter, status)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return _Tx(conn)
+
+    def enqueue(self, run_id, payloads, submitter=None, priority=0):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO tasks (run_id, payload, created_at, updated_at, submitter, priority) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, json.dumps(p), now, now, submitter, priority) for p in payloads])
+        return len(payloads)
+
+    # Same order as scheduler.FairScheduler: priority, then the submitter and the
+    # run with the fewest tasks in flight, then age. A run at its renderer cap
+    # is skipped only while another run under its cap has pending tasks, so one
+    # big sheet can't occupy every worker while a small unit waits, but a lone
+    # run still gets all of them.
+    _ACTIVE_SQL = ("(SELECT COUNT(*) FROM tasks l WHERE l.run_id = {run}.run_id AND l.status = 'leased' "
+                   "AND l.lease_expires >= :now)")
+    _CLAIM_SQL = (
+        "SELECT t.id, t.payload FROM tasks t "
+        "WHERE (t.status = 'pending' OR (t.status = 'leased' AND t.lease_expires < :now "
+        "                                AND t.attempts < :max_attempts)) "
+        f"AND ({_ACTIVE_SQL.format(run='t')} < :cap "
+        "     OR NOT EXISTS (SELECT 1 FROM tasks o WHERE o.status = 'pending' AND o.run_id != t.run_id "
+        f"                   AND {_ACTIVE_SQL.format(run='o')} < :cap)) "
+        "ORDER BY t.priority DESC, "
+        "(SELECT COUNT(*) FROM tasks l WHERE l.submitter IS t.submitter AND l.status = 'leased' "
+        " AND l.lease_expires >= :now), "
+        f"{_ACTIVE_SQL.format(run='t')}, "
+        "t.id LIMIT 1")
+
+    def claim(self, worker_id, limit=1, lease_seconds=LEASE_SECONDS, per_run_cap=MAX_RENDERERS_PER_JOB,
+              max_attempts=MAX_ATTEMPTS):
+        now = time.time()
+        claimed = []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Workers that died on the same task every time: stop retrying it
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', error = ?, lease_owner = NULL, "
+                "lease_expires = NULL, updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (f"Lease expired after {max_attempts} attempt(s)", now, now, max_attempts))
+            # One at a time so each pick sees the leases granted just before it
+            for _ in range(limit):
+                row = conn.execute(self._CLAIM_SQL, {"now": now, "cap": per_run_cap, "max_attempts": max_attempts}).fetchone()
+                if row is None:
+                    break
+                conn.execute(
+                    "UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, started_at = ?, updated_at = ? WHERE id = ?",
+                    (worker_id, now + lease_seconds, now, now, row[0]))
+                claimed.append(row)
+        return [(task_id, json.loads(payload)) for task_id, payload in claimed]
+
+    def heartbeat(self, worker_id, task_ids, lease_seconds=LEASE_SECONDS):
+        if not task_ids:
+            return 0
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                f"UPDATE tasks SET lease_expires = ?, updated_at = ? "
+                f"WHERE status = 'leased' AND lease_owner = ? AND id IN ({','.join('?' * len(task_ids))})",
+                (now + lease_seconds, now, worker_id, *task_ids))
+            return cur.rowcount
+
+    def complete(self, task_id, worker_id, result):
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE tasks SET status = 'done', result = ?, lease_owner = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (json.dumps(result), time.time(), task_id, worker_id))
+            # False means the lease was lost and another worker owns the task now
+            return cur.rowcount == 1
+
+    def fail(self, task_id, worker_id, error, max_attempts=MAX_ATTEMPTS):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (max_attempts, str(error), time.time(), task_id, worker_id))
+
+    def run_status(self, run_id):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, result, error FROM tasks WHERE run_id = ?", (run_id,)).fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        s3_keys = []
+        errors = []
+        for status, result, error in rows:
+            counts[status] = counts.get(status, 0) + 1
+            if result:
+                res = json.loads(result)
+                s3_keys.extend(res.get("s3_keys", []))
+                errors.extend(res.get("errors", []))
+            if status == "failed" and error:
+                errors.append(error)
+        return {"run_id": run_id, "tasks": len(rows), **counts,
+                "finished": counts["pending"] == 0 and counts["leased"] == 0,
+                # A re-enqueued run stores the same keys again
+                "s3_keys": list(dict.fromkeys(s3_keys)), "errors": errors}
+
+    def queue_position(self, run_id):
+        """Pending tasks ahead of this run's next one, and a wait estimate from recent task times.
+
+        "ahead" counts everything of higher priority plus older tasks of the
+        same priority, so with several submitters it is an upper bound.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT MIN(id), MAX(priority) FROM tasks WHERE run_id = ? AND status = 'pending'",
+                (run_id,)).fetchone()
+            if row[0] is None:
+                return None
+            first_id, priority = row
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE status = 'pending' AND run_id != ? "
+                "AND (priority > ? OR (priority = ? AND id < ?))",
+                (run_id, priority, priority, first_id)).fetchone()[0]
+            avg_task_s = conn.execute(
+                "SELECT AVG(updated_at - started_at) FROM (SELECT updated_at, started_at FROM tasks "
+                "WHERE status = 'done' AND started_at IS NOT NULL ORDER BY updated_at DESC LIMIT 50)").fetchone()[0]
+            workers = conn.execute(
+                "SELECT COUNT(DISTINCT lease_owner) FROM tasks WHERE status = 'leased' AND lease_expires >= ?",
+                (now,)).fetchone()[0]
+        return {"position": ahead + 1, "ahead": ahead, "active_workers": workers,
+                "avg_task_s": round(avg_task_s, 2) if avg_task_s is not None else None,
+                "expected_wait_s": round(ahead * avg_task_s / max(1, workers), 1) if avg_task_s is not None else None}
+
+
+class _Tx:
+    """Context manager that commits an explicit transaction on success and closes the connection"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+
+
+QUEUE_BACKENDS = {
+    "sqlite": SQLiteRenderQueue,
+}
+
+
+def get_queue():
+    """Build the configured queue backend.
+
+    RENDER_QUEUE_BACKEND is either a registered name ("sqlite") or an import
+    path like "mypkg.queues:RedisRenderQueue" for a custom RenderQueue.
+    """
+    backend = QUEUE_BACKENDS.get(QUEUE_BACKEND)
+    if backend is None:
+        module_name, _, class_name = QUEUE_BACKEND.partition(":")
+        backend = getattr(importlib.import_module(module_name), class_name)
+    return backend()
@@ -0,0 +1,230 @@
+import os
+import time
+import errno
+import signal
+import logging
+import threading
+import subprocess
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# The timeout adapts to RENDER_TIMEOUT_FACTOR x the recent p99 render time,
+# within [RENDER_TIMEOUT_MIN, RENDER_TIMEOUT_MAX]; RENDER_TIMEOUT applies
+# until RENDER_TIMEOUT_SAMPLES renders have succeeded
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "30"))
+RENDER_TIMEOUT_MIN = float(os.getenv("RENDER_TIMEOUT_MIN", "5"))
+RENDER_TIMEOUT_MAX = float(os.getenv("RENDER_TIMEOUT_MAX", "60"))
+RENDER_TIMEOUT_FACTOR = float(os.getenv("RENDER_TIMEOUT_FACTOR", "4"))
+RENDER_TIMEOUT_SAMPLES = 20
+RENDER_RETRIES = int(os.getenv("RENDER_RETRIES", "2"))
+RENDER_RETRY_BACKOFF = float(os.getenv("RENDER_RETRY_BACKOFF", "0.5"))
+# Address-space limit per wkhtmltopdf process; 0 disables it
+RENDER_MEMORY_MB = int(os.getenv("RENDER_MEMORY_MB", "2048"))
+BREAKER_WINDOW = int(os.getenv("RENDER_BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("RENDER_BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATE = float(os.getenv("RENDER_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("RENDER_BREAKER_COOLDOWN", "30"))
+
+logger = logging.getLogger(__name__)
+
+# Failures worth another attempt: hangs, crashes (killed by a signal, e.g. the
+# OOM killer or the memory limit) and a missing output file. A non-zero exit
+# code means wkhtmltopdf rejected the input and will do so again.
+TRANSIENT = {"timeout", "crash", "no_output", "spawn"}
+
+
+class RenderError(RuntimeError):
+    def __init__(self, message, kind, returncode=None, stdout="", stderr=""):
+        super().__init__(message)
+        self.kind = kind
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class CircuitOpenError(RenderError):
+    """Renders are failing across the board; calls fail fast until the cooldown ends"""
+
+
+def _percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct))]
+
+
+class RenderSupervisor:
+    """Runs renderer subprocesses with adaptive timeouts, retries, resource limits and a circuit breaker.
+
+    The breaker opens when at least BREAKER_FAILURE_RATE of the last
+    BREAKER_WINDOW calls failed. While open every call raises
+    CircuitOpenError; after BREAKER_COOLDOWN seconds one probe call is let
+    through and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self):
+        self.latencies = deque(maxlen=200)
+        self.outcomes = deque(maxlen=BREAKER_WINDOW)
+        self.state = "closed"
+        self.opened_at = None
+        self.last_error = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0, "timeout": 0, "crash": 0,
+                         "exit": 0, "no_output": 0, "spawn": 0, "short_circuited": 0, "breaker_opened": 0}
+
+    def timeout(self):
+        with self._lock:
+            if len(self.latencies) < RENDER_TIMEOUT_SAMPLES:
+                return min(RENDER_TIMEOUT, RENDER_TIMEOUT_MAX)
+            p99 = _percentile(sorted(self.latencies), 0.99)
+        return max(RENDER_TIMEOUT_MIN, min(p99 * RENDER_TIMEOUT_FACTOR, RENDER_TIMEOUT_MAX))
+
+    def allows_calls(self):
+        """False while the breaker is open and cooling down"""
+        with self._lock:
+            return self.state == "closed" or (
+                self.state == "open" and time.monotonic() - self.opened_at >= BREAKER_COOLDOWN)
+
+    def _admit(self):
+        with self._lock:
+            if self.state == "closed":
+                return False
+            if self.state == "open" and time.monotonic() - self.opened_at >= BREAKER_COOLDOWN:
+                self.state = "half_open"
+                self._probing = True
+                return True
+            self.counters["short_circuited"] += 1
+            raise CircuitOpenError(f"Renderer circuit open after repeated failures (last: {self.last_error})",
+                                   "circuit_open")
+
+    def _record(self, ok, probe, error=None):
+        with self._lock:
+            self.counters["succeeded" if ok else "failed"] += 1
+            if not ok:
+                self.last_error = error
+            if probe:
+                self._probing = False
+                if ok:
+                    self.state = "closed"
+                    self.outcomes.clear()
+                    logger.info("Renderer circuit closed")
+                else:
+                    self.state = "open"
+                    self.opened_at = time.monotonic()
+                    logger.warning("Renderer circuit re-opened: %s", error)
+                return
+            self.outcomes.append(ok)
+            failures = self.outcomes.count(False)
+            if self.state == "closed" and len(self.outcomes) >= BREAKER_MIN_CALLS \
+                    and failures / len(self.outcomes) >= BREAKER_FAILURE_RATE:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.counters["breaker_opened"] += 1
+                logger.error("Renderer circuit opened: %d of the last %d renders failed (last: %s)",
+                             failures, len(self.outcomes), error)
+
+    def _limit(self, pid, timeout):
+        if resource is None or not hasattr(resource, "prlimit"):
+            return
+        try:
+            if RENDER_MEMORY_MB > 0:
+                limit = RENDER_MEMORY_MB * 1024 * 1024
+                resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+            cpu = int(timeout) + 5
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cpu, cpu))
+        except OSError:
+            # Already exited, or not permitted in this container
+            pass
+
+    def _attempt(self, cmd, output_path, timeout):
+        """One subprocess run; returns (failure kind or None, returncode, stdout, stderr)"""
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                    start_new_session=os.name == "posix")
+        except OSError as e:
+            # A missing or non-executable binary won't fix itself; fork/memory pressure might
+            kind = "spawn" if e.errno in (errno.EAGAIN, errno.ENOMEM) else "exit"
+            return kind, None, "", str(e)
+        self._limit(proc.pid, timeout)
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            # Kill the whole session so helper processes don't outlive the render
+            try:
+                os.killpg(proc.pid, signal.SIGKILL) if os.name == "posix" else proc.kill()
+            except OSError:
+                pass
+            stdout, stderr = proc.communicate()
+            return "timeout", proc.returncode, stdout, stderr
+        if proc.returncode < 0:
+            return "crash", proc.returncode, stdout, stderr
+        if proc.returncode > 0:
+            return "exit", proc.returncode, stdout, stderr
+        if not os.path.exists(output_path):
+            return "no_output", proc.returncode, stdout, stderr
+        return None, proc.returncode, stdout, stderr
+
+    def run(self, cmd, output_path, label=""):
+        """Run cmd until it writes output_path; raises RenderError or CircuitOpenError"""
+        probe = self._admit()
+        with self._lock:
+            self.counters["calls"] += 1
+        try:
+            for attempt in range(RENDER_RETRIES + 1):
+                timeout = self.timeout()
+                start = time.perf_counter()
+                kind, returncode, stdout, stderr = self._attempt(cmd, output_path, timeout)
+                elapsed = time.perf_counter() - start
+                if kind is None:
+                    with self._lock:
+                        self.latencies.append(elapsed)
+                    self._record(True, probe)
+                    return subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+
+                with self._lock:
+                    self.counters[kind] += 1
+                detail = {"timeout": f"timed out after {timeout:.1f}s",
+                          "crash": f"killed by signal {-(returncode or 0)}",
+                          "no_output": "no PDF written"}.get(kind) or \
+                    (f"exit code {returncode}" if returncode is not None else stderr.strip())
+                if kind not in TRANSIENT or attempt == RENDER_RETRIES:
+                    error = f"{label}: {detail}" if label else detail
+                    self._record(False, probe, error)
+                    raise RenderError(f"Renderer failed for {error}", kind, returncode, stdout, stderr)
+                with self._lock:
+                    self.counters["retries"] += 1
+                logger.warning("Render of %s failed (%s), retrying (%d/%d)", label, detail, attempt + 1,
+                               RENDER_RETRIES)
+                time.sleep(RENDER_RETRY_BACKOFF * 2 ** attempt)
+        except RenderError:
+            raise
+        except BaseException as e:
+            self._record(False, probe, str(e))
+            raise
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            outcomes = list(self.outcomes)
+            state = self.state
+            counters = dict(self.counters)
+            reopens_in = max(0.0, BREAKER_COOLDOWN - (time.monotonic() - self.opened_at)) \
+                if state == "open" else None
+        return {
+            "state": state,
+            "reopens_in_s": round(reopens_in, 1) if reopens_in is not None else None,
+            "last_error": self.last_error,
+            "timeout_s": round(self.timeout(), 2),
+            "latency_s": {"samples": len(latencies),
+                          **({f"p{int(p * 100)}": round(_percentile(latencies, p), 3) for p in (0.5, 0.95, 0.99)}
+                             if latencies else {})},
+            "window_failure_rate": round(outcomes.count(False) / len(outcomes), 3) if outcomes else 0.0,
+            "limits": {"memory_mb": RENDER_MEMORY_MB or None, "retries": RENDER_RETRIES,
+                       "timeout_min_s": RENDER_TIMEOUT_MIN, "timeout_max_s": RENDER_TIMEOUT_MAX},
+            **counters,
+        }
+
+
+supervisor = RenderSupervisor()
@@ -0,0 +1,125 @@
+"""
+Render Worker
+Claims payslip render tasks from the shared queue, renders them with
+wkhtmltopdf and stores the PDFs in S3. Run as many replicas as needed:
+
+    python render_worker.py
+    docker compose up --scale worker=4
+"""
+
+import os
+import socket
+import logging
+import tempfile
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from renderer import PDF_POSTPROCESS, render_payslip, optimize_pdf
+from render_supervisor import CircuitOpenError, supervisor
+from slip_index import record_slips
+from render_queue import get_queue, LEASE_SECONDS
+from s3_utils import upload_to_s3
+from log_config import setup_logging, run_context
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.getenv("RENDER_POLL_INTERVAL", "2"))
+HEARTBEAT_INTERVAL = max(1, LEASE_SECONDS // 3)
+
+
+class Heartbeat(threading.Thread):
+    """Keeps the lease on the task being rendered alive until stopped"""
+
+    def __init__(self, queue, worker_id, task_id):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.worker_id = worker_id
+        self.task_id = task_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.queue.heartbeat(self.worker_id, [self.task_id])
+            except Exception as e:
+                logger.warning("Heartbeat failed for task %s: %s", self.task_id, e)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def process_task(payload):
+    """Render and store every payslip in one task; returns the task result"""
+    month = payload["month"]
+    year = payload["year"]
+    s3_keys = []
+    errors = []
+    indexed = []
+    with tempfile.TemporaryDirectory(prefix="render_") as work_dir:
+        for slip in payload["slips"]:
+            emp_id = slip["emp"]["emp_id"]
+            try:
+                pdf_path = render_payslip(slip, month, work_dir)
+                if PDF_POSTPROCESS:
+                    optimize_pdf(pdf_path)
+                s3_key = upload_to_s3(pdf_path, month=month, year=year)
+                s3_keys.append(s3_key)
+                indexed.append((emp_id, s3_key, os.path.getsize(pdf_path)))
+            except CircuitOpenError:
+                # Fail the whole task so it goes back on the queue instead of
+                # recording every remaining slip as an error
+                raise
+            except Exception as e:
+                logger.error("Error rendering %s: %s", emp_id, e, extra={"emp_id": emp_id})
+                errors.append(f"{emp_id}: {e}")
+    try:
+        record_slips(year, month, payload.get("run_id"), indexed)
+    except Exception as e:
+        logger.error("Payslip index update failed: %s", e)
+    return {"s3_keys": s3_keys, "errors": errors}
+
+
+def run_worker(worker_id=None, once=False):
+    queue = get_queue()
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    logger.info("Render worker %s started", worker_id)
+
+    while True:
+        # Don't take work while the renderer is known to be broken
+        if not supervisor.allows_calls():
+            if once:
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+        tasks = queue.claim(worker_id, limit=1)
+        if not tasks:
+            if once:
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        for task_id, payload in tasks:
+            heartbeat = Heartbeat(queue, worker_id, task_id)
+            heartbeat.start()
+            with run_context(payload.get("run_id", f"task-{task_id}")):
+                try:
+                    result = process_task(payload)
+                    if not queue.complete(task_id, worker_id, result):
+                        logger.warning("Lease on task %s was lost; result discarded", task_id)
+                    else:
+                        logger.info("Task %s done: %d stored, %d errors", task_id, len(result["s3_keys"]),
+                                    len(result["errors"]))
+                except Exception as e:
+                    logger.exception("Task %s failed", task_id)
+                    queue.fail(task_id, worker_id, e)
+                finally:
+                    heartbeat.stop()
+
+
+if __name__ == "__main__":
+    setup_logging("worker")
+    run_worker()
@@ -0,0 +1,194 @@
+import os
+import base64
+import tempfile
+import logging
+from datetime import datetime
+
+from render_supervisor import RenderError, supervisor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_DIR = os.path.join(BASE_DIR, "templates")
+LOGO_PATH = os.path.join(BASE_DIR, "logo.png")
+
+logger = logging.getLogger(__name__)
+
+# Resolved on first render; set WKHTMLTOPDF_CMD in the environment to skip detection
+WKHTMLTOPDF_CMD = os.getenv("WKHTMLTOPDF_CMD")
+
+# The logo is shown 60px high; ~3x that keeps it sharp in print without
+# embedding the full-resolution original in every slip
+LOGO_MAX_HEIGHT = int(os.getenv("LOGO_MAX_HEIGHT_PX", "180"))
+LOGO_CACHE_DIR = os.getenv("LOGO_CACHE_DIR", os.path.join(BASE_DIR, "tmp", "asset_cache"))
+
+# wkhtmltopdf defaults (600 dpi, quality 94) are sized for photos, not a one-page A4 slip
+PDF_IMAGE_DPI = os.getenv("PDF_IMAGE_DPI", "150")
+PDF_IMAGE_QUALITY = os.getenv("PDF_IMAGE_QUALITY", "80")
+# Lossless post-processing with pikepdf (also used to merge unit bundles)
+PDF_POSTPROCESS = os.getenv("PDF_POSTPROCESS", "0").lower() in ("1", "true", "yes")
+
+COMPANY = {
+    "name": "RS MAN-TECH",
+    "address": "#14, 3rd Cross, Parappana Agrahara",
+    "city": "Bengaluru-100"
+}
+
+_template = None
+_logo_base64 = None
+_logo_mime = "image/png"
+_pikepdf_warned = False
+
+
+def get_wkhtmltopdf_cmd():
+    """Detect the wkhtmltopdf path (Docker vs Windows) once per process"""
+    global WKHTMLTOPDF_CMD
+    if WKHTMLTOPDF_CMD is None:
+        if os.path.exists('/usr/local/bin/wkhtmltopdf'):
+            WKHTMLTOPDF_CMD = '/usr/local/bin/wkhtmltopdf'
+        elif os.path.exists('/usr/bin/wkhtmltopdf'):
+            WKHTMLTOPDF_CMD = '/usr/bin/wkhtmltopdf'
+        else:
+            WKHTMLTOPDF_CMD = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
+        logger.info("Using wkhtmltopdf at: %s", WKHTMLTOPDF_CMD)
+    return WKHTMLTOPDF_CMD
+
+
+def get_logo_base64():
+    try:
+        if os.path.exists(LOGO_PATH):
+            with open(LOGO_PATH, "rb") as img_file:
+                return base64.b64encode(img_file.read()).decode('utf-8')
+    except Exception as e:
+        logger.warning("Could not load logo: %s", e)
+        return None
+
+
+def get_optimized_logo():
+    """Return (base64, mime) for the logo downsampled to LOGO_MAX_HEIGHT.
+
+    The resized JPEG is cached on disk keyed by the source mtime and target
+    height, so it is built once per deployment rather than once per slip.
+    Falls back to the original logo if Pillow is unavailable.
+    """
+    if not os.path.exists(LOGO_PATH):
+        return None, _logo_mime
+    stamp = int(os.path.getmtime(LOGO_PATH))
+    cached = os.path.join(LOGO_CACHE_DIR, f"logo_{LOGO_MAX_HEIGHT}_{stamp}.jpg")
+    try:
+        if not os.path.exists(cached):
+            from PIL import Image
+            os.makedirs(LOGO_CACHE_DIR, exist_ok=True)
+            with Image.open(LOGO_PATH) as img:
+                img = img.convert("RGB")
+                if img.height > LOGO_MAX_HEIGHT:
+                    width = round(img.width * LOGO_MAX_HEIGHT / img.height)
+                    img = img.resize((width, LOGO_MAX_HEIGHT), Image.LANCZOS)
+                # Unique per call: several threads may build the cached logo at once
+                fd, tmp_path = tempfile.mkstemp(dir=LOGO_CACHE_DIR, suffix=".part")
+                try:
+                    with os.fdopen(fd, "wb") as out:
+                        img.save(out, "JPEG", quality=85, optimize=True, progressive=False)
+                    os.replace(tmp_path, cached)
+                except Exception:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+            logger.info("Logo downsampled: %d -> %d bytes", os.path.getsize(LOGO_PATH), os.path.getsize(cached))
+        with open(cached, "rb") as f:
+            return base64.b64encode(f.read()).decode('utf-8'), "image/jpeg"
+    except Exception as e:
+        logger.warning("Logo downsampling skipped: %s", e)
+        return get_logo_base64(), _logo_mime
+
+
+def get_template():
+    """Load the payslip template and logo once per process"""
+    global _template, _logo_base64, _logo_mime
+    if _template is None:
+        from jinja2 import Environment, FileSystemLoader
+        env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True)
+        _logo_base64, _logo_mime = get_optimized_logo()
+        _template = env.get_template("payslip.html")
+    return _template
+
+
+def render_html(slip, month):
+    """Render one payslip context (see app.row_to_payslip) to HTML"""
+    template = get_template()
+    return template.render(
+        company=COMPANY, emp=slip["emp"], salary_fixed=slip["salary_fixed"],
+        salary_earned=slip["salary_earned"], deduction=slip["deduction"], net_pay=slip["net_pay"],
+        net_pay_words=slip["net_pay_words"], month=month,
+        generated_on=datetime.now().strftime("%d %b %Y"), logo_base64=_logo_base64, logo_mime=_logo_mime
+    )
+
+
+def html_to_pdf(html_path, pdf_path, label=""):
+    """Run wkhtmltopdf under the render supervisor; returns the CompletedProcess.
+
+    Raises RenderError once retries are exhausted, or CircuitOpenError while
+    renders are failing across the board.
+    """
+    return supervisor.run([get_wkhtmltopdf_cmd(), "--enable-local-file-access", "--page-size", "A4",
+        "--margin-top", "10mm", "--margin-bottom", "10mm", "--margin-left", "10mm",
+        "--margin-right", "10mm", "--image-dpi", PDF_IMAGE_DPI, "--image-quality", PDF_IMAGE_QUALITY,
+        "--no-outline", html_path, pdf_path], pdf_path, label=label)
+
+
+def optimize_pdf(pdf_path):
+    """Losslessly recompress a PDF in place; returns (bytes_before, bytes_after).
+
+    Streams are re-deflated, small objects are packed into compressed object
+    streams and unreferenced resources are dropped. The file is left alone if
+    the result is not smaller or pikepdf is not installed.
+    """
+    global _pikepdf_warned
+    before = os.path.getsize(pdf_path)
+    try:
+        import pikepdf
+    except ImportError:
+        if not _pikepdf_warned:
+            logger.warning("PDF post-processing skipped: pikepdf is not installed")
+            _pikepdf_warned = True
+        return before, before
+
+    tmp_path = f"{pdf_path}.opt"
+    with pikepdf.open(pdf_path) as pdf:
+        pdf.remove_unreferenced_resources()
+        pdf.save(tmp_path, compress_streams=True, recompress_flate=True,
+                 object_stream_mode=pikepdf.ObjectStreamMode.generate)
+    after = os.path.getsize(tmp_path)
+    if after < before:
+        os.replace(tmp_path, pdf_path)
+        return before, after
+    os.remove(tmp_path)
+    return before, before
+
+
+def write_html(slip, month, output_dir):
+    """Render one payslip to {emp_id}.html in output_dir and return the path"""
+    html_path = os.path.join(output_dir, f"{slip['emp']['emp_id']}.html")
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write(render_html(slip, month))
+    return html_path
+
+
+def convert_to_pdf(emp_id, html_path, output_dir):
+    """Convert a rendered payslip HTML file to {emp_id}.pdf and return the path.
+
+    Raises RenderError (a RuntimeError) when wkhtmltopdf fails or produces no file.
+    """
+    pdf_path = os.path.join(output_dir, f"{emp_id}.pdf")
+    try:
+        html_to_pdf(html_path, pdf_path, label=emp_id)
+    except RenderError as e:
+        if e.kind != "circuit_open":
+            logger.error("wkhtmltopdf failed for %s (%s)", emp_id, e.kind,
+                         extra={"emp_id": emp_id, "returncode": e.returncode, "stdout": e.stdout, "stderr": e.stderr})
+        raise
+    return pdf_path
+
+
+def render_payslip(slip, month, output_dir):
+    """Render one payslip to HTML and PDF in output_dir and return the PDF path"""
+    html_path = write_html(slip, month, output_dir)
+    return convert_to_pdf(slip["emp"]["emp_id"], html_path, output_dir)
@@ -0,0 +1,284 @@
+import os
+import re
+import time
+import sqlite3
+from contextlib import closing
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHECKPOINT_DB = os.getenv("RUN_CHECKPOINT_DB", os.path.join(BASE_DIR, "tmp", "runs.db"))
+# A "running" run (or an email claim) with no progress for this long is taken
+# to belong to a process that died, and may be started again
+RUN_STALE_SECONDS = int(os.getenv("RUN_STALE_SECONDS", "600"))
+
+# Per-row progress flags, in pipeline order
+STEPS = ("rendered", "stored", "emailed")
+
+# Preview API field -> run_preview column; also the columns the preview can be sorted by
+PREVIEW_FIELDS = {
+    "Row": "row_index", "EMP_ID": "emp_id", "Name": "name", "Designation": "designation",
+    "Unit_Name": "unit_name", "Email": "email", "Net_Pay": "net_pay", "Status": "status",
+    "Email_Status": "email_status", "Error": "error", "PDF_Path": "pdf_path", "S3_Key": "s3_key",
+    "PDF_Bytes": "pdf_bytes",
+}
+PREVIEW_MAX_PER_PAGE = 500
+
+
+def make_run_id(file_hash, year, month):
+    """Runs are keyed by workbook content and pay period, so re-uploading the same sheet resumes it"""
+    return f"{file_hash[:16]}-{year}-{month}"
+
+
+def safe_run_id(run_id):
+    """run_id as a single file-name segment, for directories and files named after a run"""
+    # Run ids embed the month/year form fields, which may hold "/" or ".."
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", run_id)
+
+
+_schema_ready = False
+
+
+def _connect():
+    global _schema_ready
+    os.makedirs(os.path.dirname(CHECKPOINT_DB) or ".", exist_ok=True)
+    conn = sqlite3.connect(CHECKPOINT_DB, timeout=30)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if not _schema_ready:
+        _init_schema(conn)
+        _schema_ready = True
+    return conn
+
+
+def _init_schema(conn):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            file_hash TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            filename TEXT,
+            month TEXT,
+            year TEXT,
+            notify INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS run_rows (
+            run_id TEXT NOT NULL,
+            row_index INTEGER NOT NULL,
+            emp_id TEXT,
+            rendered INTEGER NOT NULL DEFAULT 0,
+            stored INTEGER NOT NULL DEFAULT 0,
+            emailed INTEGER NOT NULL DEFAULT 0,
+            pdf_path TEXT,
+            s3_key TEXT,
+            updated_at REAL NOT NULL,
+            email_claimed_at REAL,
+            PRIMARY KEY (run_id, row_index)
+        )""")
+    # Databases created before email claims existed
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(run_rows)")}
+    if "email_claimed_at" not in columns:
+        conn.execute("ALTER TABLE run_rows ADD COLUMN email_claimed_at REAL")
+    # One row per sheet row of a finished run, for the paginated preview
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS run_preview (
+            run_id TEXT NOT NULL,
+            row_index INTEGER NOT NULL,
+            emp_id TEXT,
+            name TEXT,
+            designation TEXT,
+            unit_name TEXT,
+            email TEXT,
+            net_pay REAL,
+            status TEXT NOT NULL,
+            email_status TEXT,
+            error TEXT,
+            pdf_path TEXT,
+            s3_key TEXT,
+            pdf_bytes INTEGER,
+            PRIMARY KEY (run_id, row_index)
+        )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS run_preview_unit ON run_preview (run_id, unit_name)")
+    conn.commit()
+
+
+def start_run(run_id, file_hash, file_path, filename, month, year, notify, restart=False):
+    """Create or reopen a run; restart=True forgets all row checkpoints first.
+
+    Returns False, changing nothing, while the run is already running
+    somewhere: status "running" with a run or row update in the last
+    RUN_STALE_SECONDS.
+    """
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        cur = conn.execute(
+            "INSERT INTO runs (run_id, file_hash, file_path, filename, month, year, notify, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 'running', ?, ?) "
+            "ON CONFLICT(run_id) DO UPDATE SET file_path = excluded.file_path, notify = excluded.notify, "
+            "status = 'running', updated_at = excluded.updated_at "
+            "WHERE runs.status != 'running' OR MAX(runs.updated_at, COALESCE("
+            "    (SELECT MAX(updated_at) FROM run_rows WHERE run_rows.run_id = runs.run_id), 0)) < ?",
+            (run_id, file_hash, file_path, filename, month, year, int(bool(notify)), now, now,
+             now - RUN_STALE_SECONDS))
+        if cur.rowcount == 0:
+            return False
+        if restart:
+            conn.execute("DELETE FROM run_rows WHERE run_id = ?", (run_id,))
+    return True
+
+
+def finish_run(run_id, status):
+    with closing(_connect()) as conn, conn:
+        conn.execute("UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?", (status, time.time(), run_id))
+
+
+def get_run(run_id):
+    with closing(_connect()) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def load_checkpoints(run_id):
+    """Return {row_index: {emp_id, rendered, stored, emailed, pdf_path, s3_key}} for a run"""
+    with closing(_connect()) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT * FROM run_rows WHERE run_id = ?", (run_id,)).fetchall()
+    return {r["row_index"]: dict(r) for r in rows}
+
+
+def mark(run_id, row_index, emp_id, step, pdf_path=None, s3_key=None):
+    """Durably record that one step finished for one sheet row"""
+    if step not in STEPS:
+        raise ValueError(f"Unknown checkpoint step: {step}")
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            f"INSERT INTO run_rows (run_id, row_index, emp_id, {step}, pdf_path, s3_key, updated_at) "
+            f"VALUES (?, ?, ?, 1, ?, ?, ?) "
+            f"ON CONFLICT(run_id, row_index) DO UPDATE SET emp_id = excluded.emp_id, {step} = 1, "
+            f"pdf_path = COALESCE(excluded.pdf_path, pdf_path), s3_key = COALESCE(excluded.s3_key, s3_key), "
+            f"updated_at = excluded.updated_at",
+            (run_id, int(row_index), emp_id, pdf_path, s3_key, time.time()))
+
+
+def claim_email(run_id, row_index, emp_id):
+    """Reserve one row's email for the caller; False if it was sent or another sender holds it"""
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        cur = conn.execute(
+            "INSERT INTO run_rows (run_id, row_index, emp_id, email_claimed_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(run_id, row_index) DO UPDATE SET email_claimed_at = excluded.email_claimed_at, "
+            "updated_at = excluded.updated_at "
+            "WHERE run_rows.emailed = 0 AND (run_rows.email_claimed_at IS NULL OR run_rows.email_claimed_at < ?)",
+            (run_id, int(row_index), emp_id, now, now, now - RUN_STALE_SECONDS))
+        return cur.rowcount == 1
+
+
+def release_email(run_id, row_index):
+    """Give up a claim whose send failed, so a later run may retry it"""
+    with closing(_connect()) as conn, conn:
+        conn.execute("UPDATE run_rows SET email_claimed_at = NULL WHERE run_id = ? AND row_index = ? AND emailed = 0",
+                     (run_id, int(row_index)))
+
+
+def run_progress(run_id):
+    """Summary counts for a run, or None if unknown"""
+    run = get_run(run_id)
+    if run is None:
+        return None
+    with closing(_connect()) as conn:
+        counts = conn.execute(
+            "SELECT COUNT(*), SUM(rendered), SUM(stored), SUM(emailed) FROM run_rows WHERE run_id = ?",
+            (run_id,)).fetchone()
+    return {"run_id": run_id, "status": run["status"], "filename": run["filename"], "month": run["month"],
+            "year": run["year"], "notify": bool(run["notify"]), "rows_started": counts[0] or 0,
+            "rendered": counts[1] or 0, "stored": counts[2] or 0, "emailed": counts[3] or 0}
+
+
+def save_preview(run_id, entries):
+    """Replace a run's preview with entries (dicts keyed like PREVIEW_FIELDS; Row is 1-based)"""
+    columns = list(PREVIEW_FIELDS.values())
+    rows = [tuple(int(e["Row"]) - 1 if field == "Row" else e.get(field) for field in PREVIEW_FIELDS)
+            for e in entries]
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM run_preview WHERE run_id = ?", (run_id,))
+        conn.executemany(
+            f"INSERT INTO run_preview (run_id, {', '.join(columns)}) VALUES (?, {', '.join('?' * len(columns))})",
+            [(run_id,) + row for row in rows])
+
+
+def _preview_where(run_id, emp_ids=None, unit=None, status=None, email_status=None, search=None):
+    clauses, params = ["run_id = ?"], [run_id]
+    if emp_ids:
+        clauses.append(f"emp_id IN ({', '.join('?' * len(emp_ids))})")
+        params.extend(str(e) for e in emp_ids)
+    if unit:
+        clauses.append("unit_name = ?")
+        params.append(unit)
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if email_status == "none":
+        clauses.append("email_status IS NULL")
+    elif email_status:
+        clauses.append("email_status = ?")
+        params.append(email_status)
+    if search:
+        clauses.append("(emp_id LIKE ? OR name LIKE ?)")
+        params.extend([f"%{search}%"] * 2)
+    return " AND ".join(clauses), params
+
+
+def _to_entry(row):
+    entry = {field: row[column] for field, column in PREVIEW_FIELDS.items()}
+    entry["Row"] += 1
+    return entry
+
+
+def query_preview(run_id, page=1, per_page=50, sort="Row", order="asc", **filters):
+    """One page of a run's preview plus per-unit and per-status counts; None if the run has no preview.
+
+    filters are unit, status, email_status ("none" for not emailed yet) and search (EMP_ID/Name substring).
+    """
+    column = {k.lower(): v for k, v in PREVIEW_FIELDS.items()}.get(str(sort).lower(), "row_index")
+    direction = "DESC" if str(order).lower() == "desc" else "ASC"
+    per_page = max(1, min(int(per_page), PREVIEW_MAX_PER_PAGE))
+    page = max(1, int(page))
+    where, params = _preview_where(run_id, **filters)
+
+    with closing(_connect()) as conn:
+        conn.row_factory = sqlite3.Row
+        units = conn.execute("SELECT unit_name, COUNT(*) FROM run_preview WHERE run_id = ? "
+                             "GROUP BY unit_name ORDER BY unit_name", (run_id,)).fetchall()
+        if not units:
+            return None
+        statuses = conn.execute("SELECT status, COUNT(*) FROM run_preview WHERE run_id = ? GROUP BY status",
+                                (run_id,)).fetchall()
+        email_statuses = conn.execute("SELECT COALESCE(email_status, 'none'), COUNT(*) FROM run_preview "
+                                      "WHERE run_id = ? GROUP BY email_status", (run_id,)).fetchall()
+        total = conn.execute(f"SELECT COUNT(*) FROM run_preview WHERE {where}", params).fetchone()[0]
+        rows = conn.execute(f"SELECT * FROM run_preview WHERE {where} ORDER BY {column} {direction}, row_index "
+                            f"LIMIT ? OFFSET ?", params + [per_page, (page - 1) * per_page]).fetchall()
+
+    return {"run_id": run_id, "page": page, "per_page": per_page, "total": total,
+            "pages": (total + per_page - 1) // per_page, "sort": sort, "order": direction.lower(),
+            "units": {u[0] or "": u[1] for u in units}, "statuses": {s[0]: s[1] for s in statuses},
+            "email_statuses": {s[0]: s[1] for s in email_statuses}, "rows": [_to_entry(r) for r in rows]}
+
+
+def select_preview(run_id, **filters):
+    """Every preview entry of a run matching the filters, in sheet order"""
+    where, params = _preview_where(run_id, **filters)
+    with closing(_connect()) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f"SELECT * FROM run_preview WHERE {where} ORDER BY row_index", params).fetchall()
+    return [_to_entry(r) for r in rows]
+
+
+def set_email_status(run_id, statuses):
+    """statuses: {Row (1-based): 'sent' | 'failed'}"""
+    with closing(_connect()) as conn, conn:
+        conn.executemany("UPDATE run_preview SET email_status = ? WHERE run_id = ? AND row_index = ?",
+                         [(status, run_id, int(row) - 1) for row, status in statuses.items()])
@@ -1,6 +1,9 @@
 import os
-import boto3
-from botocore.exceptions import ClientError
+import hashlib
+import logging
+import tempfile
+import threading
+import zipfile
 from dotenv import load_dotenv
 import io
 
@@ -8,13 +11,44 @@ load_dotenv()
 
 S3_BUCKET = os.getenv("S3_BUCKET")
 AWS_REGION = os.getenv("AWS_REGION")
+# Point at a local S3 stand-in (MinIO, moto server) for development; presigned
+# URLs are signed for this host, so it must be reachable from the browser
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
 
-s3 = boto3.client(
-    "s3",
-    region_name=AWS_REGION,
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-)
+# Lifetime of presigned links, in seconds; SigV4 caps them at 7 days
+PRESIGNED_URL_EXPIRY = int(os.getenv("PRESIGNED_URL_EXPIRY", "900"))
+MAX_PRESIGNED_EXPIRY = 7 * 24 * 3600
+# Month archives built for presigned downloads; add an S3 lifecycle rule on
+# this prefix to expire old ones
+ARCHIVE_PREFIX = os.getenv("S3_ARCHIVE_PREFIX", "archives")
+ARCHIVE_SPOOL_BYTES = 64 * 1024 * 1024
+# Combined per-unit PDFs live in a subfolder of each month: {year}/{month}/units/
+BUNDLE_PREFIX = os.getenv("S3_BUNDLE_PREFIX", "units")
+
+logger = logging.getLogger(__name__)
+
+_s3 = None
+_s3_lock = threading.Lock()
+
+def get_s3_client():
+    """Create the boto3 S3 client on first use (boto3 import is slow)"""
+    global _s3
+    if _s3 is None:
+        with _s3_lock:
+            if _s3 is None:
+                import boto3
+                from botocore.config import Config
+                _s3 = boto3.client(
+                    "s3",
+                    region_name=AWS_REGION,
+                    endpoint_url=S3_ENDPOINT_URL,
+                    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                    # Local stand-ins don't do virtual-hosted bucket names
+                    config=Config(signature_version="s3v4",
+                                  s3={"addressing_style": "path" if S3_ENDPOINT_URL else "auto"}),
+                )
+    return _s3
 
 def upload_to_s3(local_path, s3_key=None, month=None, year=None):
     """Upload file to S3 with optional month/year folder"""
@@ -26,31 +60,115 @@ def upload_to_s3(local_path, s3_key=None, month=None, year=None):
     elif month:
         s3_key = f"{month}/{s3_key}"
 
-    s3.upload_file(local_path, S3_BUCKET, s3_key, ExtraArgs={"ContentType": "application/pdf"})
+    get_s3_client().upload_file(local_path, S3_BUCKET, s3_key, ExtraArgs={"ContentType": "application/pdf"})
     return s3_key
 
 def download_from_s3(s3_key, local_path):
     """Download file from S3"""
-    s3.download_file(S3_BUCKET, s3_key, local_path)
+    get_s3_client().download_file(S3_BUCKET, s3_key, local_path)
     return local_path
 
-def list_s3_pdfs(month=None, year=None):
-    """List all PDF files in S3 bucket, optionally filtered by year/month folder"""
+def _month_prefix(month=None, year=None):
     if year and month:
-        prefix = f"{year}/{month}/"
+        return f"{year}/{month}/"
     elif month:
-        prefix = f"{month}/"
-    else:
-        prefix = ""
-    
-    response = s3.list_objects_v2(Bucket=S3_BUCKET, Prefix=prefix)
-    if 'Contents' not in response:
-        return []
-    return [obj['Key'] for obj in response['Contents'] if obj['Key'].endswith('.pdf')]
+        return f"{month}/"
+    return ""
+
+def _list_pdf_objects(prefix):
+    """All payslip PDFs under prefix, following list pagination past 1000 keys; unit bundles are skipped"""
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    objects = []
+    for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=prefix):
+        objects.extend(obj for obj in page.get("Contents", []) if obj["Key"].endswith(".pdf")
+                       and f"/{BUNDLE_PREFIX}/" not in f"/{obj['Key']}")
+    return objects
+
+def list_s3_pdfs(month=None, year=None):
+    """List all PDF files in S3 bucket, optionally filtered by year/month folder"""
+    return [obj["Key"] for obj in _list_pdf_objects(_month_prefix(month, year))]
 
 def download_s3_file_to_memory(s3_key):
     """Download S3 file to memory"""
     file_obj = io.BytesIO()
-    s3.download_fileobj(S3_BUCKET, s3_key, file_obj)
+    get_s3_client().download_fileobj(S3_BUCKET, s3_key, file_obj)
     file_obj.seek(0)
     return file_obj
+
+def read_s3_object(s3_key):
+    """Whole object as bytes in one GET (download_fileobj adds a HEAD round trip first)"""
+    return get_s3_client().get_object(Bucket=S3_BUCKET, Key=s3_key)["Body"].read()
+
+def presigned_url(s3_key, expires=None, download_name=None):
+    """Time-limited GET link to an object, so clients fetch it from S3 directly"""
+    expires = min(int(expires or PRESIGNED_URL_EXPIRY), MAX_PRESIGNED_EXPIRY)
+    params = {"Bucket": S3_BUCKET, "Key": s3_key}
+    if download_name:
+        params["ResponseContentDisposition"] = f'attachment; filename="{download_name}"'
+    return get_s3_client().generate_presigned_url("get_object", Params=params, ExpiresIn=expires)
+
+def _object_exists(s3_key):
+    from botocore.exceptions import ClientError
+    try:
+        get_s3_client().head_object(Bucket=S3_BUCKET, Key=s3_key)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+def build_archive(s3_keys, archive_key):
+    """Zip the given PDFs into one S3 object; spools to disk for large months"""
+    s3 = get_s3_client()
+    with tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_BYTES) as buf:
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zipf:
+            for s3_key in s3_keys:
+                with zipf.open(os.path.basename(s3_key), "w") as entry:
+                    s3.download_fileobj(S3_BUCKET, s3_key, entry)
+        buf.seek(0)
+        s3.upload_fileobj(buf, S3_BUCKET, archive_key, ExtraArgs={"ContentType": "application/zip"})
+    return archive_key
+
+def month_archive_key(month=None, year=None):
+    """S3 key of the zip for the month's current PDFs plus the PDF keys, or (None, []) if there are none.
+
+    The archive name includes a digest of the PDF keys and ETags, so it is
+    built once and reused until a payslip in that month is added or changed.
+    """
+    objects = sorted(_list_pdf_objects(_month_prefix(month, year)), key=lambda o: o["Key"])
+    if not objects:
+        return None, []
+    digest = hashlib.sha1("".join(f"{o['Key']}:{o['ETag']}\n" for o in objects).encode()).hexdigest()[:16]
+    return f"{ARCHIVE_PREFIX}/{_month_prefix(month, year)}payslips-{digest}.zip", [o["Key"] for o in objects]
+
+_archive_builds = set()
+_archive_builds_lock = threading.Lock()
+
+def _build_archive_in_background(s3_keys, archive_key):
+    try:
+        logger.info("Building archive %s from %d PDFs", archive_key, len(s3_keys))
+        build_archive(s3_keys, archive_key)
+    except Exception as e:
+        logger.error("Archive build %s failed: %s", archive_key, e)
+    finally:
+        with _archive_builds_lock:
+            _archive_builds.discard(archive_key)
+
+def refresh_month_archive(month=None, year=None):
+    """(archive_key, ready) for the month; starts a background build when the archive is missing.
+
+    archive_key is None when the month has no PDFs. Builds already underway in
+    this process are not started twice.
+    """
+    archive_key, s3_keys = month_archive_key(month, year)
+    if archive_key is None:
+        return None, False
+    if _object_exists(archive_key):
+        return archive_key, True
+    with _archive_builds_lock:
+        if archive_key in _archive_builds:
+            return archive_key, False
+        _archive_builds.add(archive_key)
+    threading.Thread(target=_build_archive_in_background, args=(s3_keys, archive_key),
+                     name="archive-build", daemon=True).start()
+    return archive_key, False
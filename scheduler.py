@@ -0,0 +1,194 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# Slots are per process: run gunicorn with one worker and several threads so
+# every upload in the container competes for the same renderers
+RENDER_SLOTS = max(1, int(os.getenv("RENDER_SLOTS", str(os.cpu_count() or 2))))
+SMTP_SLOTS = max(1, int(os.getenv("SMTP_SLOTS", "4")))
+MAX_RENDERERS_PER_JOB = max(1, int(os.getenv("MAX_RENDERERS_PER_JOB", "2")))
+MAX_SENDERS_PER_JOB = max(1, int(os.getenv("MAX_SENDERS_PER_JOB", "2")))
+MAX_PRIORITY = int(os.getenv("SCHEDULER_MAX_PRIORITY", "10"))
+# Smoothing for the average slot hold time behind expected_wait_s
+HOLD_EWMA_ALPHA = 0.2
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """One generation or email job competing for slots"""
+
+    def __init__(self, job_id, submitter, priority=0, kind="generate"):
+        self.id = job_id
+        self.submitter = submitter or "anonymous"
+        self.priority = int(priority)
+        self.kind = kind
+        self.created_at = time.time()
+        self.active = {}
+        self.waiting = {}
+        self.granted = {}
+        self.waited_s = {}
+
+
+class FairScheduler:
+    """Hands out a fixed number of slots per resource ("renderer", "smtp") across jobs.
+
+    A free slot goes to the highest-priority waiting job; among equals, to the
+    submitter holding the fewest slots of that resource, then to that
+    submitter's job holding the fewest, then to the oldest job. While a job
+    under its per-job cap is waiting, jobs at the cap get nothing more, so one
+    3,000-row sheet can't take every wkhtmltopdf process while a small unit
+    waits; with nobody else waiting a job may use every slot.
+    """
+
+    def __init__(self, capacities, job_caps):
+        self.capacities = dict(capacities)
+        self.job_caps = dict(job_caps)
+        self.in_use = {r: 0 for r in self.capacities}
+        self.avg_hold_s = {r: None for r in self.capacities}
+        self.jobs = {}
+        self._cond = threading.Condition()
+
+    def register(self, job_id, submitter, priority=0, kind="generate"):
+        job = Job(job_id, submitter, priority, kind)
+        with self._cond:
+            # A resumed run reuses its run id; keep the ids unique while both are live
+            if job.id in self.jobs:
+                job.id = f"{job_id}#{int(job.created_at * 1000)}"
+            self.jobs[job.id] = job
+        logger.info("Scheduled %s job %s for %s (priority %d)", kind, job.id, job.submitter, job.priority)
+        return job
+
+    def unregister(self, job):
+        with self._cond:
+            self.jobs.pop(job.id, None)
+            self._cond.notify_all()
+
+    @contextmanager
+    def job(self, job_id, submitter, priority=0, kind="generate"):
+        job = self.register(job_id, submitter, priority, kind)
+        try:
+            yield job
+        finally:
+            self.unregister(job)
+
+    def _submitter_active(self, submitter, resource):
+        return sum(j.active.get(resource, 0) for j in self.jobs.values() if j.submitter == submitter)
+
+    def _eligible(self, resource):
+        """Jobs waiting for resource and under their cap, in the order slots will be granted"""
+        cap = self.job_caps.get(resource, self.capacities[resource])
+        waiting = [j for j in self.jobs.values() if j.waiting.get(resource, 0) > 0]
+        # The cap only matters while a job under it is waiting; a lone job gets every slot
+        under_cap = [j for j in waiting if j.active.get(resource, 0) < cap]
+        if under_cap:
+            waiting = under_cap
+        return sorted(waiting, key=lambda j: (-j.priority, self._submitter_active(j.submitter, resource),
+                                              j.active.get(resource, 0), j.created_at))
+
+    def acquire(self, job, resource):
+        start = time.perf_counter()
+        with self._cond:
+            job.waiting[resource] = job.waiting.get(resource, 0) + 1
+            try:
+                while True:
+                    if self.in_use[resource] < self.capacities[resource]:
+                        eligible = self._eligible(resource)
+                        if eligible and eligible[0] is job:
+                            break
+                    self._cond.wait()
+            finally:
+                job.waiting[resource] -= 1
+            self.in_use[resource] += 1
+            job.active[resource] = job.active.get(resource, 0) + 1
+            job.granted[resource] = job.granted.get(resource, 0) + 1
+            job.waited_s[resource] = job.waited_s.get(resource, 0.0) + time.perf_counter() - start
+            # Another job may be next in line for a slot that is still free
+            self._cond.notify_all()
+        return time.perf_counter()
+
+    def release(self, job, resource, acquired_at):
+        held = time.perf_counter() - acquired_at
+        with self._cond:
+            self.in_use[resource] -= 1
+            job.active[resource] -= 1
+            avg = self.avg_hold_s[resource]
+            self.avg_hold_s[resource] = held if avg is None else avg + HOLD_EWMA_ALPHA * (held - avg)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, job, resource):
+        """Hold one slot of resource for the block; a no-op for job=None (unscheduled callers)"""
+        if job is None:
+            yield
+            return
+        acquired_at = self.acquire(job, resource)
+        try:
+            yield
+        finally:
+            self.release(job, resource, acquired_at)
+
+    def _job_status(self, job, order):
+        resources = {}
+        for resource in self.capacities:
+            waiting = job.waiting.get(resource, 0)
+            entry = {"active": job.active.get(resource, 0), "waiting": waiting,
+                     "granted": job.granted.get(resource, 0),
+                     "waited_s": round(job.waited_s.get(resource, 0.0), 3)}
+            if waiting:
+                ranked = order[resource]
+                if job in ranked:
+                    position = ranked.index(job) + 1
+                    avg = self.avg_hold_s[resource] or 0.0
+                    free = self.capacities[resource] - self.in_use[resource]
+                    entry["position"] = position
+                    # Slots free up at capacity/avg_hold per second on average
+                    entry["expected_wait_s"] = round(max(0, position - free) * avg / self.capacities[resource], 1)
+                else:
+                    # At its per-job cap: it waits for one of its own slots instead
+                    entry["position"] = None
+                    entry["capped"] = True
+                    entry["expected_wait_s"] = round(self.avg_hold_s[resource] or 0.0, 1)
+            resources[resource] = entry
+        return {"job_id": job.id, "kind": job.kind, "submitter": job.submitter, "priority": job.priority,
+                "age_s": round(time.time() - job.created_at, 1), "resources": resources}
+
+    def describe(self, job):
+        with self._cond:
+            return self._job_status(job, {r: self._eligible(r) for r in self.capacities})
+
+    def job_status(self, job_id):
+        """Queue position and expected wait for every job registered under job_id, or None"""
+        with self._cond:
+            order = {r: self._eligible(r) for r in self.capacities}
+            jobs = [j for j in self.jobs.values() if j.id == job_id or j.id.startswith(f"{job_id}#")]
+            if not jobs:
+                return None
+            return [self._job_status(j, order) for j in jobs]
+
+    def snapshot(self):
+        with self._cond:
+            order = {r: self._eligible(r) for r in self.capacities}
+            return {
+                "resources": {r: {"capacity": self.capacities[r], "in_use": self.in_use[r],
+                                  "per_job_cap": self.job_caps.get(r),
+                                  "waiting": sum(j.waiting.get(r, 0) for j in self.jobs.values()),
+                                  "avg_hold_s": round(self.avg_hold_s[r], 3) if self.avg_hold_s[r] is not None else None}
+                              for r in self.capacities},
+                "jobs": [self._job_status(j, order) for j in sorted(self.jobs.values(), key=lambda j: j.created_at)],
+            }
+
+
+def clamp_priority(value, allow_raise=False):
+    """Parse a requested priority; only trusted callers may go above 0"""
+    try:
+        priority = int(value or 0)
+    except (TypeError, ValueError):
+        priority = 0
+    return max(-MAX_PRIORITY, min(priority, MAX_PRIORITY if allow_raise else 0))
+
+
+scheduler = FairScheduler({"renderer": RENDER_SLOTS, "smtp": SMTP_SLOTS},
+                          {"renderer": MAX_RENDERERS_PER_JOB, "smtp": MAX_SENDERS_PER_JOB})
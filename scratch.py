@@ -0,0 +1,224 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+
+from run_checkpoints import safe_run_id
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", os.path.join(BASE_DIR, "payslips"))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(BASE_DIR, "uploads"))
+# Where intermediate HTML goes: "auto" uses RAM-backed /dev/shm when it is
+# writable, "" keeps it next to the PDFs, anything else is a directory path
+SCRATCH_HTML_DIR = os.getenv("SCRATCH_HTML_DIR", "auto")
+SCRATCH_MAX_BYTES = int(os.getenv("SCRATCH_MAX_MB", "2048")) * 1024 * 1024
+SCRATCH_MAX_AGE_HOURS = float(os.getenv("SCRATCH_MAX_AGE_HOURS", "72"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_MB", "1024")) * 1024 * 1024
+UPLOAD_MAX_AGE_HOURS = float(os.getenv("UPLOAD_MAX_AGE_HOURS", str(7 * 24)))
+SWEEP_INTERVAL = int(os.getenv("SCRATCH_SWEEP_INTERVAL", "300"))
+ORPHAN_HTML_AGE_HOURS = 1
+
+logger = logging.getLogger(__name__)
+
+# Runs generating in this process and the uploads they read; never evicted
+_active_runs = {}
+_active_uploads = {}
+_lock = threading.Lock()
+_sweep_lock = threading.Lock()
+_html_root = None
+_last_sweep_at = 0.0
+_stats = {"sweeps": 0, "evicted_runs": 0, "evicted_uploads": 0, "evicted_bytes": 0, "last_sweep_at": None,
+          "last_sweep_s": None}
+
+
+def html_root():
+    """Directory holding per-run HTML intermediates, resolved once per process"""
+    global _html_root
+    if _html_root is None:
+        root = SCRATCH_HTML_DIR
+        if root == "auto":
+            root = "/dev/shm/payslip-html" if os.access("/dev/shm", os.W_OK) else ""
+        _html_root = root or os.path.join(OUTPUT_DIR, ".html")
+    return _html_root
+
+
+def pdf_dir(run_id):
+    return os.path.join(OUTPUT_DIR, safe_run_id(run_id))
+
+
+def html_dir(run_id):
+    return os.path.join(html_root(), safe_run_id(run_id))
+
+
+def _fs_type(path):
+    """Filesystem type of the mount holding path (Linux only), e.g. "tmpfs" """
+    path = os.path.realpath(path)
+    best, fs_type = "", None
+    try:
+        with open("/proc/mounts", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and (path == parts[1] or path.startswith(parts[1].rstrip("/") + "/")) \
+                        and len(parts[1]) > len(best):
+                    best, fs_type = parts[1], parts[2]
+    except OSError:
+        pass
+    return fs_type
+
+
+@contextmanager
+def run_scratch(run_id, upload_path=None):
+    """Create a run's HTML directory and protect it, the run's PDFs and its upload from eviction.
+
+    The PDF directory is left to the first render to create. The HTML
+    directory is removed when the block exits; PDFs stay until evicted by
+    age or size.
+    """
+    with _lock:
+        _active_runs[run_id] = _active_runs.get(run_id, 0) + 1
+        if upload_path:
+            _active_uploads[upload_path] = _active_uploads.get(upload_path, 0) + 1
+    os.makedirs(html_dir(run_id), exist_ok=True)
+    maybe_sweep()
+    try:
+        yield pdf_dir(run_id), html_dir(run_id)
+    finally:
+        with _lock:
+            _active_runs[run_id] -= 1
+            last = _active_runs[run_id] == 0
+            if last:
+                del _active_runs[run_id]
+            if upload_path:
+                _active_uploads[upload_path] -= 1
+                if _active_uploads[upload_path] == 0:
+                    del _active_uploads[upload_path]
+        if last:
+            shutil.rmtree(html_dir(run_id), ignore_errors=True)
+
+
+def is_active(run_id):
+    """True while a run_scratch block for run_id is open in this process"""
+    with _lock:
+        return run_id in _active_runs
+
+
+def discard(path):
+    """Remove an intermediate file as soon as it has been consumed"""
+    try:
+        os.remove(path)
+    except (FileNotFoundError, TypeError):
+        pass
+
+
+def _size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path), 1
+    total = files = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+                files += 1
+            except FileNotFoundError:
+                pass
+    return total, files
+
+
+def _entries(directory, skip=()):
+    """(mtime, bytes, path) for each top-level entry of directory, oldest first"""
+    entries = []
+    if not os.path.isdir(directory):
+        return entries
+    for entry in os.scandir(directory):
+        if entry.path in skip or entry.name.startswith(".") or entry.name.endswith(".part"):
+            continue
+        try:
+            mtime = entry.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        entries.append((mtime, _size(entry.path)[0], entry.path))
+    entries.sort()
+    return entries
+
+
+def _evict(entries, max_bytes, max_age_hours, now):
+    """Remove entries older than max_age_hours, then the oldest until under max_bytes"""
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    cutoff = now - max_age_hours * 3600
+    for mtime, size, path in entries:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            discard(path)
+        total -= size
+        removed.append((path, size))
+    return removed
+
+
+def sweep(now=None):
+    """Evict old or excess run directories, uploads and orphaned HTML; returns what was removed"""
+    now = now or time.time()
+    start = time.perf_counter()
+    with _sweep_lock:
+        with _lock:
+            active_dirs = {pdf_dir(r) for r in _active_runs} | {html_dir(r) for r in _active_runs}
+            active_uploads = set(_active_uploads)
+        runs = _evict(_entries(OUTPUT_DIR, skip=active_dirs), SCRATCH_MAX_BYTES, SCRATCH_MAX_AGE_HOURS, now)
+        uploads = _evict(_entries(UPLOAD_DIR, skip=active_uploads), UPLOAD_MAX_BYTES, UPLOAD_MAX_AGE_HOURS, now)
+        # HTML left behind by a crashed process; live runs' directories are skipped
+        orphans = _evict(_entries(html_root(), skip=active_dirs), float("inf"), ORPHAN_HTML_AGE_HOURS, now)
+        removed_bytes = sum(size for _, size in runs + uploads + orphans)
+        _stats["sweeps"] += 1
+        _stats["evicted_runs"] += len(runs)
+        _stats["evicted_uploads"] += len(uploads)
+        _stats["evicted_bytes"] += removed_bytes
+        _stats["last_sweep_at"] = now
+        _stats["last_sweep_s"] = round(time.perf_counter() - start, 3)
+    if runs or uploads:
+        logger.info("Scratch sweep evicted %d run dir(s), %d upload(s), %d bytes", len(runs), len(uploads),
+                    removed_bytes)
+    return {"runs": [p for p, _ in runs], "uploads": [p for p, _ in uploads], "orphans": [p for p, _ in orphans],
+            "bytes": removed_bytes}
+
+
+def maybe_sweep():
+    """Sweep in the background at most once per SWEEP_INTERVAL seconds"""
+    global _last_sweep_at
+    now = time.time()
+    with _lock:
+        if now - _last_sweep_at < SWEEP_INTERVAL:
+            return
+        _last_sweep_at = now
+
+    def run():
+        try:
+            sweep(now)
+        except Exception as e:
+            logger.warning("Scratch sweep failed: %s", e)
+
+    threading.Thread(target=run, name="scratch-sweep", daemon=True).start()
+
+
+def usage():
+    """Disk usage, limits and eviction counters for /scratch"""
+    def area(path, max_bytes=None, max_age_hours=None):
+        size, files = _size(path) if os.path.isdir(path) else (0, 0)
+        info = {"path": path, "bytes": size, "files": files, "fs_type": _fs_type(path)}
+        if max_bytes is not None:
+            info.update(max_bytes=max_bytes, max_age_hours=max_age_hours,
+                        used_pct=round(100.0 * size / max_bytes, 1) if max_bytes else None)
+        return info
+
+    payslips = area(OUTPUT_DIR, SCRATCH_MAX_BYTES, SCRATCH_MAX_AGE_HOURS)
+    if os.path.isdir(OUTPUT_DIR):
+        payslips["runs"] = sum(1 for e in os.scandir(OUTPUT_DIR) if e.is_dir() and not e.name.startswith("."))
+    with _lock:
+        active = sorted(_active_runs)
+    return {"payslips": payslips, "uploads": area(UPLOAD_DIR, UPLOAD_MAX_BYTES, UPLOAD_MAX_AGE_HOURS),
+            "html": area(html_root()), "active_runs": active, "sweep_interval_s": SWEEP_INTERVAL,
+            "evictions": dict(_stats)}
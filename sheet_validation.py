@@ -0,0 +1,98 @@
+import os
+
+# Columns read with get_numeric_value() when a payslip is built
+AMOUNT_FIELDS = [
+    "Fixed_Basic", "Fixed_DA", "Fixed_HRA", "Fixed_Bonus", "Fixed_Total",
+    "Earned_Basic", "Earned_DA", "Earned_HRA", "Earned_Leave_Wages", "Other_Allowance",
+    "Earned_Bonus", "Earned_Total",
+    "PF", "ESI", "PT", "LWF", "Total_Deduction", "Net_Pay",
+]
+# Other columns the payslip uses; missing ones are left blank on the slip
+DETAIL_FIELDS = [
+    "Designation", "Unit_Name", "UAN_No", "ESI_No", "DOJ", "Bank_AC", "IFSC_Code",
+    "Email", "Phone", "Basic_Days", "Actual_Days",
+]
+
+NET_PAY_TOLERANCE = float(os.getenv("NET_PAY_TOLERANCE", "1.0"))
+MAX_PROBLEMS = int(os.getenv("VALIDATION_MAX_PROBLEMS", "1000"))
+
+
+def _blank(series):
+    return series.isna() | (series.astype(str).str.strip() == "")
+
+
+def validate_table(df, col_map, tolerance=NET_PAY_TOLERANCE):
+    """Check every row of a normalized employee table without rendering anything.
+
+    col_map is the mapping from app.build_col_map(). Returns a dict with the
+    columns that are missing and a list of row-level problems, each with the
+    sheet row number (index + 1, as in the generation log), EMP_ID, a problem
+    code and a message.
+    """
+    import pandas as pd
+
+    def col(name):
+        return col_map.get(name.lower())
+
+    problems = []
+
+    def add(mask, code, message):
+        for index in df.index[mask]:
+            emp_id = emp_ids.get(index)
+            problems.append({"row": int(index) + 1, "EMP_ID": None if pd.isna(emp_id) else emp_id, "problem": code,
+                             "message": message(index)})
+
+    emp_col, name_col = col("EMP_ID"), col("Name")
+    emp_raw = df[emp_col] if emp_col else pd.Series(None, index=df.index, dtype=object)
+    name_raw = df[name_col] if name_col else pd.Series(None, index=df.index, dtype=object)
+    emp_ids = emp_raw.where(~_blank(emp_raw)).astype(str).str.strip().where(~_blank(emp_raw))
+    blank_emp = _blank(emp_raw)
+    blank_name = _blank(name_raw)
+
+    # Rows with neither EMP_ID nor Name are skipped quietly by the generator
+    data_rows = ~(blank_emp & blank_name)
+
+    add(data_rows & blank_emp, "blank_emp_id",
+        lambda i: f"EMP_ID is blank for '{name_raw[i]}'; no payslip would be generated")
+    add(data_rows & ~blank_emp & blank_name, "blank_name",
+        lambda i: "Name is blank; the row would be skipped")
+
+    amounts = {}
+    for field in AMOUNT_FIELDS:
+        c = col(field)
+        if not c:
+            continue
+        raw = df[c]
+        values = pd.to_numeric(raw, errors="coerce")
+        amounts[field] = values.fillna(0.0)
+        bad = data_rows & raw.notna() & ~_blank(raw) & values.isna()
+        add(bad, "non_numeric", lambda i, f=field, s=raw: f"{f} is not a number: '{s[i]}' (would be treated as 0)")
+
+    if all(f in amounts for f in ("Net_Pay", "Earned_Total", "Total_Deduction")):
+        expected = amounts["Earned_Total"] - amounts["Total_Deduction"]
+        diff = (amounts["Net_Pay"] - expected).abs()
+        add(data_rows & ~blank_emp & (diff > tolerance), "net_pay_mismatch",
+            lambda i: f"Net_Pay {amounts['Net_Pay'][i]:.2f} != Earned_Total {amounts['Earned_Total'][i]:.2f} "
+                      f"- Total_Deduction {amounts['Total_Deduction'][i]:.2f} (= {expected[i]:.2f})")
+
+    dup = data_rows & ~blank_emp & emp_ids.duplicated(keep=False)
+    if dup.any():
+        rows_by_id = {k: [int(i) + 1 for i in v] for k, v in emp_ids[dup].groupby(emp_ids[dup]).groups.items()}
+        add(dup, "duplicate_emp_id",
+            lambda i: f"EMP_ID {emp_ids[i]} appears on rows {rows_by_id[emp_ids[i]]}; "
+                      f"later rows would overwrite {emp_ids[i]}.pdf")
+
+    problems.sort(key=lambda p: p["row"])
+    summary = {}
+    for p in problems:
+        summary[p["problem"]] = summary.get(p["problem"], 0) + 1
+
+    return {
+        "rows": int(data_rows.sum()),
+        "employees": int(emp_ids[data_rows & ~blank_emp & ~blank_name].nunique()),
+        "missing_optional": [f for f in AMOUNT_FIELDS + DETAIL_FIELDS if not col(f)],
+        "summary": summary,
+        "problem_count": len(problems),
+        "problems": problems[:MAX_PROBLEMS],
+        "truncated": len(problems) > MAX_PROBLEMS,
+    }
@@ -0,0 +1,145 @@
+"""
+Payslip Index
+Maps (year, month, EMP_ID) to the S3 key of that employee's slip so one
+payslip can be served without listing the bucket. Written by the app and
+the render workers as slips are stored; slips stored before the index
+existed can be added once with:
+
+    python slip_index.py backfill --year 2026 --month January
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict
+from contextlib import closing
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SLIP_INDEX_DB = os.getenv("SLIP_INDEX_DB", os.path.join(BASE_DIR, "tmp", "slip_index.db"))
+SLIP_CACHE_MAX_BYTES = int(os.getenv("SLIP_CACHE_MAX_MB", "32")) * 1024 * 1024
+
+_schema_ready = False
+
+
+def _connect():
+    global _schema_ready
+    os.makedirs(os.path.dirname(SLIP_INDEX_DB) or ".", exist_ok=True)
+    conn = sqlite3.connect(SLIP_INDEX_DB, timeout=30)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if not _schema_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NOCASE so /payslips/2026/january/e0001 finds what was stored as January/E0001
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS slips (
+                year TEXT NOT NULL,
+                month TEXT NOT NULL COLLATE NOCASE,
+                emp_id TEXT NOT NULL COLLATE NOCASE,
+                s3_key TEXT NOT NULL,
+                run_id TEXT,
+                pdf_bytes INTEGER,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (year, month, emp_id)
+            )""")
+        _schema_ready = True
+    return conn
+
+
+def record_slips(year, month, run_id, slips):
+    """Index stored slips; slips is an iterable of (emp_id, s3_key, pdf_bytes). A rerun replaces older entries."""
+    now = time.time()
+    rows = [(str(year), str(month), str(emp_id), s3_key, run_id, pdf_bytes, now)
+            for emp_id, s3_key, pdf_bytes in slips if emp_id and s3_key]
+    if not rows:
+        return 0
+    with closing(_connect()) as conn, conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO slips (year, month, emp_id, s3_key, run_id, pdf_bytes, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def find_slip(year, month, emp_id):
+    """Index entry for one employee's slip as a dict, or None"""
+    with closing(_connect()) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM slips WHERE year = ? AND month = ? AND emp_id = ?",
+                           (str(year), str(month), str(emp_id))).fetchone()
+    return dict(row) if row else None
+
+
+class SlipCache:
+    """Byte-bounded LRU of PDF contents.
+
+    Entries are keyed by S3 key and index timestamp, so a regenerated slip
+    (same key, newer entry) is never served from a stale copy.
+    """
+
+    def __init__(self, max_bytes=SLIP_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = data
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+cache = SlipCache()
+
+
+def backfill(year, month):
+    """Index the slips already in S3 for one pay period (one bucket listing)"""
+    from s3_utils import _month_prefix, _list_pdf_objects
+    objects = _list_pdf_objects(_month_prefix(month=month, year=year))
+    # Only direct children: archives and unit bundles live under other prefixes
+    slips = [(os.path.splitext(os.path.basename(obj["Key"]))[0], obj["Key"], obj.get("Size"))
+             for obj in objects if os.path.dirname(obj["Key"]) == f"{year}/{month}"]
+    return record_slips(year, month, None, slips)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the payslip index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fill = sub.add_parser("backfill", help="index slips already stored in S3 for a pay period")
+    fill.add_argument("--year", required=True)
+    fill.add_argument("--month", required=True)
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        from dotenv import load_dotenv
+        load_dotenv()
+        print(f"Indexed {backfill(args.year, args.month)} slip(s) for {args.month} {args.year}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
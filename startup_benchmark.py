@@ -0,0 +1,105 @@
+"""
+Startup Benchmark
+Measures how long `import app` takes in a fresh interpreter (what every
+gunicorn worker boot and CLI call pays) and checks it against a budget.
+
+    python startup_benchmark.py [--runs 5] [--budget-ms 300] [--warm]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "300"))
+
+# Modules that must stay lazy: importing app should not pull these in
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "boto3", "botocore", "openpyxl"]
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_once():
+    """Import app in a fresh interpreter; returns (wall_ms, {module: cumulative_us}, loaded heavy modules)"""
+    code = ("import sys, app; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=BASE_DIR, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"import app failed:\n{result.stderr}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if m:
+            modules[m.group(4)] = int(m.group(2))
+    loaded_heavy = [m for m in result.stdout.strip().split(",") if m]
+    return wall_ms, modules, loaded_heavy
+
+
+def measure_warm_up():
+    """Time the background warm-up steps in-process"""
+    sys.path.insert(0, BASE_DIR)
+    import app
+    app.warm_up()
+    return app._warmup["components"], app._warmup["error"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import time against a budget")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to list")
+    parser.add_argument("--warm", action="store_true", help="also time the /ready warm-up steps")
+    args = parser.parse_args()
+
+    # First run compiles .pyc files; do not count it
+    measure_once()
+
+    walls, app_imports = [], []
+    modules, loaded_heavy = {}, []
+    for _ in range(args.runs):
+        wall_ms, modules, loaded_heavy = measure_once()
+        walls.append(wall_ms)
+        app_imports.append(modules.get("app", 0) / 1000)
+
+    print("=" * 60)
+    print("  STARTUP BENCHMARK")
+    print("=" * 60)
+    print(f"Runs:                 {args.runs}")
+    print(f"Interpreter + import: median {statistics.median(walls):.1f} ms, max {max(walls):.1f} ms")
+    print(f"import app:           median {statistics.median(app_imports):.1f} ms, max {max(app_imports):.1f} ms")
+    print(f"Budget:               {args.budget_ms:.1f} ms")
+
+    print("\nSlowest imports (cumulative):")
+    for name, us in sorted(modules.items(), key=lambda kv: kv[1], reverse=True)[1:args.top + 1]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    if args.warm:
+        components, error = measure_warm_up()
+        print("\nWarm-up (first use) cost:")
+        for name, ms in components.items():
+            print(f"  {ms:8.1f} ms  {name}")
+        if error:
+            print(f"  warm-up error: {error}")
+
+    ok = True
+    if loaded_heavy:
+        print(f"\n❌ Heavy modules imported eagerly: {', '.join(loaded_heavy)}")
+        ok = False
+    if statistics.median(app_imports) > args.budget_ms:
+        print(f"\n❌ import app exceeds budget ({statistics.median(app_imports):.1f} > {args.budget_ms:.1f} ms)")
+        ok = False
+    if ok:
+        print("\n✅ Startup within budget")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import os
+import re
+import shutil
+import logging
+import tempfile
+
+from s3_utils import BUNDLE_PREFIX, upload_to_s3, download_from_s3
+
+# Slips merged per intermediate file: bounds open files and in-memory page
+# objects while a large unit is combined
+BUNDLE_BATCH_SIZE = int(os.getenv("BUNDLE_BATCH_SIZE", "200"))
+
+logger = logging.getLogger(__name__)
+
+
+def bundle_name(value):
+    """File-safe name for a group value, e.g. "Unit 3 / East" -> "Unit_3_East" """
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(value)).strip("._")
+    return name or "unassigned"
+
+
+def merge_pdfs(paths, out_path, batch_size=BUNDLE_BATCH_SIZE):
+    """Concatenate PDFs into out_path without re-rendering.
+
+    Sources are merged batch_size at a time into part files, which are then
+    merged, so at most one batch of sources is open at once. Returns the page
+    count. Requires pikepdf.
+    """
+    import pikepdf
+
+    def merge(sources, target):
+        pages = 0
+        opened = []
+        try:
+            with pikepdf.new() as out:
+                for path in sources:
+                    src = pikepdf.open(path)
+                    opened.append(src)
+                    out.pages.extend(src.pages)
+                    pages += len(src.pages)
+                out.save(target, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+        finally:
+            for src in opened:
+                src.close()
+        return pages
+
+    paths = list(paths)
+    if len(paths) <= batch_size:
+        return merge(paths, out_path)
+    parts = []
+    pages = 0
+    try:
+        for i in range(0, len(paths), batch_size):
+            part = f"{out_path}.part{len(parts)}"
+            pages += merge(paths[i:i + batch_size], part)
+            parts.append(part)
+        merge(parts, out_path)
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+    return pages
+
+
+def build_bundles(groups, year, month):
+    """Merge each group's slips into one PDF and store it under {year}/{month}/units/.
+
+    groups maps a group value to its slips in print order; each slip is a
+    dict with EMP_ID and PDF_Path and/or S3_Key. Local PDFs are used when
+    still on disk, otherwise the stored copy is fetched to a temp file.
+    Returns one summary dict per group.
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bundle_") as work_dir:
+        for value, slips in groups.items():
+            name = bundle_name(value)
+            paths = []
+            missing = []
+            fetch_dir = os.path.join(work_dir, name)
+            os.makedirs(fetch_dir, exist_ok=True)
+            for slip in slips:
+                local = slip.get("PDF_Path")
+                if local and os.path.exists(local):
+                    paths.append(local)
+                elif slip.get("S3_Key"):
+                    path = os.path.join(fetch_dir, f"{len(paths):05d}.pdf")
+                    try:
+                        paths.append(download_from_s3(slip["S3_Key"], path))
+                    except Exception as e:
+                        logger.warning("Could not fetch %s for bundle %s: %s", slip["S3_Key"], name, e)
+                        missing.append(slip.get("EMP_ID"))
+                else:
+                    missing.append(slip.get("EMP_ID"))
+
+            summary = {"group": value, "name": name, "slips": len(paths), "missing": missing, "s3_key": None}
+            if paths:
+                out_path = os.path.join(work_dir, f"{name}.pdf")
+                summary["pages"] = merge_pdfs(paths, out_path)
+                summary["bytes"] = os.path.getsize(out_path)
+                summary["s3_key"] = upload_to_s3(out_path, s3_key=f"{BUNDLE_PREFIX}/{name}.pdf", month=month, year=year)
+                os.remove(out_path)
+                logger.info("Bundled %d slip(s) for %s into %s", len(paths), value, summary["s3_key"])
+            # Fetched copies are only needed until the bundle is stored
+            shutil.rmtree(fetch_dir, ignore_errors=True)
+            results.append(summary)
+    return results
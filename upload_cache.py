@@ -0,0 +1,137 @@
+import os
+import hashlib
+import logging
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv("PARSED_CACHE_DIR", os.path.join(BASE_DIR, "tmp", "parsed_cache"))
+CACHE_MAX_ENTRIES = int(os.getenv("PARSED_CACHE_MAX_ENTRIES", "64"))
+CACHE_MAX_BYTES = int(os.getenv("PARSED_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# Bump when the parsing/normalization in app.py changes so stale tables are not reused
+CACHE_VERSION = "1"
+
+CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def save_upload(file_storage, upload_dir, filename):
+    """Stream an uploaded file to disk while hashing it.
+
+    The file is stored under its content hash so identical uploads share one
+    copy and same-name uploads from different users never overwrite each other.
+    Returns (file_path, sha256_hex).
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = file_storage.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+        file_hash = digest.hexdigest()
+        file_path = os.path.join(upload_dir, f"{file_hash}{ext}")
+        if os.path.exists(file_path):
+            os.remove(tmp_path)
+            # Scratch eviction goes by mtime; a re-upload counts as fresh use
+            os.utime(file_path, None)
+        else:
+            os.replace(tmp_path, file_path)
+        return file_path, file_hash
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _cache_path(file_hash):
+    return os.path.join(CACHE_DIR, f"{file_hash}.v{CACHE_VERSION}.parquet")
+
+
+def has_cached_table(file_hash):
+    return os.path.exists(_cache_path(file_hash))
+
+
+def load_cached_table(file_hash):
+    """Return the cached normalized table for a file hash, or None on a miss"""
+    path = _cache_path(file_hash)
+    if not os.path.exists(path):
+        return None
+    import numpy as np
+    import pandas as pd
+    try:
+        df = pd.read_parquet(path)
+    except Exception as e:
+        logger.warning("Parsed cache read failed for %s: %s", file_hash, e)
+        return None
+    # Touch for LRU ordering
+    os.utime(path, None)
+    # Parquet round-trips missing strings as None; restore NaN like a fresh parse
+    obj_cols = df.select_dtypes(include="object").columns
+    if len(obj_cols):
+        df[obj_cols] = df[obj_cols].where(df[obj_cols].notna(), np.nan)
+    return df
+
+
+def store_cached_table(file_hash, df):
+    """Write a normalized table to the cache and evict least recently used entries"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(file_hash)
+    # Unique per call: threads of one process may store the same workbook at once
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=f"{os.path.basename(path)}.", suffix=".part")
+    os.close(fd)
+    try:
+        try:
+            df.to_parquet(tmp_path)
+        except Exception:
+            # Columns mixing numbers and text (e.g. a stray 'abc' in PF) cannot be
+            # stored as Arrow; the app only ever str()s or float()s cell values,
+            # so storing those cells as text keeps the parse result equivalent
+            _stringify_mixed_columns(df).to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        # Duplicate column names etc. cannot be stored; the upload still works uncached
+        logger.warning("Parsed cache write skipped for %s: %s", file_hash, e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    evict_cache()
+    return True
+
+
+def _stringify_mixed_columns(df):
+    df = df.copy()
+    for c in df.select_dtypes(include="object").columns:
+        df[c] = df[c].map(lambda v: v if v is None or v != v else str(v))
+    return df
+
+
+def evict_cache():
+    """Drop least recently used entries until the cache fits its entry and size limits"""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".parquet"):
+            continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    entries.sort()
+    total_bytes = sum(size for _, size, _ in entries)
+    while entries and (len(entries) > CACHE_MAX_ENTRIES or total_bytes > CACHE_MAX_BYTES):
+        _, size, path = entries.pop(0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size